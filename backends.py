@@ -0,0 +1,162 @@
+"""
+Gamepad backends
+
+A backend allocates virtual devices. Devices follow the vgamepad interface the server
+relies on: a report attribute, update() to submit it, update_from_buffer() to submit
+a report's raw bytes instead, reset(), and register_notification()/unregister_notification()
+for rumble and LED feedback.
+"""
+
+import ctypes
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque
+
+from vgamepad.win.vigem_commons import (VIGEM_TARGET_TYPE, XUSB_REPORT, XUSB_REPORT_STRUCT, DS4_REPORT,
+                                        DS4_REPORT_STRUCT, DS4_REPORT_INIT, DS4_DPAD_DIRECTIONS)
+
+
+class Backend(ABC):
+    name = None
+
+    @abstractmethod
+    def create_device(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        """
+        :param: a VIGEM_TARGET_TYPE
+        :return: a new, plugged in, virtual device
+        """
+        pass
+
+    def warmup(self, background=False):
+        """
+        Does any expensive one-time setup ahead of the first create_device()
+
+        :param: True to run in a daemon thread and return it instead of blocking
+        """
+        pass
+
+
+class ViGEmBackend(Backend):
+    """
+    Devices on the ViGEmBus driver (Windows)
+    """
+    name = 'vigem'
+
+    def create_device(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        import vgamepad
+        if target_type == VIGEM_TARGET_TYPE.DualShock4Wired:
+            return vgamepad.VDS4Gamepad()
+        return vgamepad.VX360Gamepad()
+
+    def warmup(self, background=False):
+        import vgamepad
+        return vgamepad.warmup(background)
+
+
+class LoopbackGamepad:
+    """
+    In-memory virtual device: records submitted reports and lets callers inject feedback
+    """
+
+    def __init__(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired, history=None):
+        """
+        :param target_type: the VIGEM_TARGET_TYPE to emulate
+        :param history: maximum number of reports kept, None for unbounded
+        """
+        self.target_type = target_type
+        self.reports = deque(maxlen=history)
+        self.callback = None
+        self.report = self.get_default_report()
+        self.update()
+
+    def get_default_report(self):
+        if self.target_type == VIGEM_TARGET_TYPE.DualShock4Wired:
+            report = DS4_REPORT()
+            DS4_REPORT_INIT(report)
+            return report
+        return XUSB_REPORT()
+
+    def get_type(self):
+        return self.target_type
+
+    def reset(self):
+        """
+        Resets the report to the default state
+        """
+        self.report = self.get_default_report()
+
+    def set_state(self, buttons, *values, direction=DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NONE):
+        """
+        Sets the whole report at once, with the arguments of VX360Gamepad.set_state or VDS4Gamepad.set_state
+
+        :return: True if the report changed
+        """
+        if self.target_type == VIGEM_TARGET_TYPE.DualShock4Wired:
+            special, left_trigger, right_trigger, left_x, left_y, right_x, right_y = values
+            data = DS4_REPORT_STRUCT.pack(left_x, left_y, right_x, right_y, (buttons & ~0xF) | direction,
+                                          special, left_trigger, right_trigger)
+        else:
+            data = XUSB_REPORT_STRUCT.pack(buttons, *values)
+        changed = data != bytes(self.report)
+        ctypes.memmove(ctypes.addressof(self.report), data, len(data))
+        return changed
+
+    def update(self):
+        """
+        Records the current report as (time.perf_counter(), report bytes)
+        """
+        self.reports.append((time.perf_counter(), bytes(self.report)))
+
+    def update_from_buffer(self, buffer):
+        """
+        Records a report given as raw bytes, self.report is left unchanged
+        """
+        self.reports.append((time.perf_counter(), bytes(buffer)))
+
+    def register_notification(self, callback_function):
+        self.callback = callback_function
+
+    def unregister_notification(self):
+        self.callback = None
+
+    def notify(self, large_motor, small_motor, led_number=0):
+        """
+        Delivers a rumble/LED notification to the registered callback, as the driver would
+
+        :param large_motor: integer in [0, 255]
+        :param small_motor: integer in [0, 255]
+        :param led_number: integer in [0, 255]
+        """
+        callback = self.callback
+        if callback is not None:
+            callback(None, None, large_motor, small_motor, led_number, None)
+
+
+class LoopbackBackend(Backend):
+    """
+    Driverless backend for tests and benchmarks
+    """
+    name = 'loopback'
+
+    def __init__(self, history=100000):
+        self.history = history
+        self.devices = weakref.WeakSet()
+
+    def create_device(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        device = LoopbackGamepad(target_type, self.history)
+        self.devices.add(device)
+        return device
+
+
+BACKENDS = {backend.name: backend for backend in (ViGEmBackend, LoopbackBackend)}
+
+
+def create_backend(name='vigem'):
+    """
+    :param: a backend name, see BACKENDS
+    :return: a Backend
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend {!r}, expected one of {}".format(name, ', '.join(BACKENDS)))
+    return BACKENDS[name]()
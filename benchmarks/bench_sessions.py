@@ -0,0 +1,118 @@
+"""
+Multi-player scaling
+
+Drives 1, 4, 8 and 16 simulated clients at 120 Hz, each on its own thread (like the
+server's one thread per socket) and its own session, against the loopback backend,
+and reports per-client latency from frame creation to the report reaching the device.
+
+Usage: python benchmarks/bench_sessions.py [seconds per run] [--json]
+"""
+
+import json
+import os
+import statistics
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import backends  # noqa: E402
+import config  # noqa: E402
+import pool  # noqa: E402
+import protocol  # noqa: E402
+import sessions  # noqa: E402
+import translation  # noqa: E402
+
+CLIENTS = (1, 4, 8, 16)
+RATE = 120
+XUSB_LX = struct.Struct('<4xh')
+
+
+class Connection:
+    def send(self, message):
+        pass
+
+
+def client(players, translator, duration, sent):
+    session = players.open(Connection())
+    interval = 1.0 / RATE
+    deadline = time.perf_counter()
+    end = deadline + duration
+    seq = 0
+    while deadline < end:
+        seq += 1
+        # the sequence number rides in lx so each report can be matched to its frame
+        lx = seq % 32767
+        frame = protocol.Frame(0, seq & 0xFFFF, 0, 0, 0, 0, lx, 0, 0, 0)
+        sent[lx] = time.perf_counter()
+        session.output.submit(translator.translate(frame))
+        deadline += interval
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return session
+
+
+def run(count, duration):
+    backend = backends.create_backend('loopback')
+    devices = pool.DevicePool(backend, count)
+    devices.fill()
+    players = sessions.SessionManager(devices, count, 0, config.OUTPUT_RATE, config.PUSH_ON_EDGE)
+    sent = [{} for _ in range(count)]
+    results = [None] * count
+
+    def target(index):
+        # raw sticks so lx comes through unchanged
+        results[index] = client(players, translation.create_translator(profile='raw'), duration, sent[index])
+
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    clients = []
+    for index, session in enumerate(results):
+        latencies = []
+        for received, data in list(session.device.reports)[1:]:
+            lx = XUSB_LX.unpack_from(data)[0]
+            if lx in sent[index]:
+                latencies.append((received - sent[index][lx]) * 1000)
+        latencies.sort()
+        clients.append({
+            'reports': len(latencies),
+            'p50_ms': statistics.median(latencies) if latencies else None,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] if latencies else None,
+        })
+        players.close(session)
+    return {
+        'clients': count,
+        'frames_per_s': sum(len(s) for s in sent) / elapsed,
+        'cpu_percent': cpu / elapsed * 100,
+        'per_client': clients,
+    }
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    duration = float(args[0]) if args else 3.0
+    runs = [run(count, duration) for count in CLIENTS]
+    if '--json' in sys.argv:
+        print(json.dumps(runs, indent=2))
+        return
+    print('output rate {} Hz, clients at {} Hz'.format(config.OUTPUT_RATE, RATE))
+    for result in runs:
+        p50 = [c['p50_ms'] for c in result['per_client'] if c['p50_ms'] is not None]
+        p99 = [c['p99_ms'] for c in result['per_client'] if c['p99_ms'] is not None]
+        print('{:>3} clients: {:8.1f} frames/s, cpu {:5.1f}%, p50 {:6.2f} ms (worst client {:6.2f}), p99 worst {:6.2f} ms'.format(
+            result['clients'], result['frames_per_s'], result['cpu_percent'],
+            statistics.median(p50), max(p50), max(p99)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Where launch time goes
+
+Times, in a fresh interpreter, each step the server takes before it can accept a
+controller: imports, ViGEmClient.dll loading, the bus connection, the first device,
+the default profile's tables and the tray icon. Steps that cannot run here (e.g. no
+driver on Linux) are reported as unavailable.
+
+Then launches server.py headless on the loopback backend and times how long it
+takes to answer the first request for the page (its own timeline, see startup.py,
+is printed by the server and served at /metrics).
+
+Usage: python benchmarks/bench_startup.py [--json]
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def _import(name):
+    return lambda: __import__(name)
+
+
+def _load_dll():
+    from vgamepad.win import vigem_client
+    vigem_client.load()
+
+
+def _connect_bus():
+    from vgamepad.win.virtual_gamepad import get_vbus
+    get_vbus()
+
+
+def _first_device():
+    import vgamepad
+    return vgamepad.VX360Gamepad()
+
+
+def _compile_profile():
+    import curves
+    curves.compile_radial(curves.PROFILES['default'])
+
+
+def _tray_icon():
+    import server
+    server.trayImage().load()
+
+
+def _first_page(timeout=30):
+    """
+    :return: seconds from launching server.py until it answered GET /
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    environment = dict(os.environ, PORT=str(port), STADIA_BACKEND='loopback', STADIA_TRAY='0')
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py')], env=environment,
+                               stdout=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                # a connection accepted before the page can be served just waits for it
+                urllib.request.urlopen('http://127.0.0.1:{}/'.format(port), timeout=timeout).read()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.001)
+        raise TimeoutError('no answer after {} s'.format(timeout))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+STEPS = [
+    ('import vgamepad', _import('vgamepad')),
+    ('load ViGEmClient.dll', _load_dll),
+    ('connect ViGEmBus', _connect_bus),
+    ('first VX360Gamepad', _first_device),
+    ('import asyncio', _import('asyncio')),
+    ('import websockets', _import('websockets')),
+    ('import app modules', lambda: [__import__(name) for name in ('engine', 'sessions', 'translation', 'backends')]),
+    ('compile default profile', _compile_profile),
+    ('import pystray', _import('pystray')),
+    ('import PIL.Image', _import('PIL.Image')),
+    ('tray icon (cached)', _tray_icon),
+]
+
+
+def main():
+    results = []
+    keep = []  # devices must stay alive until the end, their removal is not part of startup
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            keep.append(step())
+            error = None
+        except Exception as e:
+            error = '{}: {}'.format(type(e).__name__, e)
+        results.append({'step': name, 'ms': (time.perf_counter() - start) * 1000, 'error': error})
+    try:
+        first_page = {'step': 'server: first page', 'ms': _first_page() * 1000, 'error': None}
+    except Exception as e:
+        first_page = {'step': 'server: first page', 'ms': None, 'error': '{}: {}'.format(type(e).__name__, e)}
+    if '--json' in sys.argv:
+        print(json.dumps(results + [first_page], indent=2))
+        return
+    for result in results:
+        if result['error']:
+            print('{:<24} unavailable ({})'.format(result['step'], result['error']))
+        else:
+            print('{:<24} {:9.2f} ms'.format(result['step'], result['ms']))
+    print('{:<24} {:9.2f} ms'.format('total', sum(r['ms'] for r in results if not r['error'])))
+    if first_page['error']:
+        print('{:<24} unavailable ({})'.format(first_page['step'], first_page['error']))
+    else:
+        print('{:<24} {:9.2f} ms'.format(first_page['step'], first_page['ms']))
+
+
+if __name__ == '__main__':
+    main()
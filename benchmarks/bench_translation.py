@@ -0,0 +1,68 @@
+"""
+Per-frame cost of turning a client message into a report
+
+Compares the old per-key press_button/release_button chain with the compiled
+translation tables, for both the JSON and the binary frame formats.
+
+Usage: python benchmarks/bench_translation.py [iterations]
+"""
+
+import itertools
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import protocol  # noqa: E402
+import translation  # noqa: E402
+from vgamepad.win.vigem_commons import XUSB_REPORT  # noqa: E402
+
+MESSAGE = {str(index): index % 3 == 0 for index in range(protocol.BUTTON_COUNT)}
+MESSAGE.update({'6': 0.25, '7': 1.0, 'lx': 0.5, 'ly': -0.25, 'rx': -1.0, 'ry': 0.75})
+TEXT = json.dumps(MESSAGE)
+BINARY = protocol.encode_frame(protocol.frame_from_message(MESSAGE))
+# frames whose left stick moves past the hysteresis every time
+MOVING = itertools.cycle([protocol.encode_frame(protocol.decode_frame(BINARY)._replace(lx=lx))
+                          for lx in range(-32000, 32000, 1000)])
+
+
+def legacy(text, report):
+    # equivalent of the if/elif chain previously found in server.py and controller.py,
+    # tests/test_translation.py checks that the tables give the same reports
+    message = json.loads(text)
+    report.sThumbLX = int(message['lx'] * 32767)
+    report.sThumbLY = -int(message['ly'] * 32767)
+    report.sThumbRX = int(message['rx'] * 32767)
+    report.sThumbRY = -int(message['ry'] * 32767)
+    for index, button in translation.X360_BUTTONS.items():
+        if message[str(index)] == True:  # noqa: E712
+            report.wButtons = report.wButtons | button
+        elif message[str(index)] == False:  # noqa: E712
+            report.wButtons = report.wButtons & ~button
+    report.bLeftTrigger = int(message['6'] * 255)
+    report.bRightTrigger = int(message['7'] * 255)
+    return report
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    translator = translation.create_translator(profile='raw')
+    shaped = translation.create_translator(profile='default')
+    report = XUSB_REPORT()
+    cases = {
+        'legacy json chain': lambda: legacy(TEXT, report),
+        'json + tables': lambda: translator.translate(protocol.frame_from_message(json.loads(TEXT))),
+        'binary + tables': lambda: translator.translate(protocol.decode_frame(BINARY)),
+        # the sticks do not move, hysteresis keeps the last output
+        'binary + curves': lambda: shaped.translate(protocol.decode_frame(BINARY)),
+        'binary + curves, moving': lambda: shaped.translate(protocol.decode_frame(next(MOVING))),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=iterations, repeat=5))
+        print('{:<24} {:8.3f} us/frame'.format(name, best / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main()
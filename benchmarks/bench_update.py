@@ -0,0 +1,114 @@
+"""
+Per-call cost of handing a report to the driver
+
+Compares filling an XUSB_REPORT field by field and passing it by value (what
+VX360Gamepad.update() does) with packing the report's bytes and passing a pointer
+to them (what update_from_buffer() does on x64), and setting a whole frame with
+one press/release call per button against a single set_state().
+
+On Windows with ViGEmBus this drives a real virtual controller. Elsewhere it times
+the same ctypes marshalling against a libc function that ignores its arguments, which
+isolates the Python and ctypes side of the call.
+
+Usage: python benchmarks/bench_update.py [iterations]
+"""
+
+import ctypes
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from vgamepad.win.vigem_commons import XUSB_BUTTON, XUSB_REPORT, XUSB_REPORT_STRUCT  # noqa: E402
+from vgamepad.win.virtual_gamepad import VX360Gamepad  # noqa: E402
+
+FIELDS = (0x1234, 12, 250, -12000, 3000, 32767, -32768)
+PACK = XUSB_REPORT_STRUCT.pack
+
+
+def stand_ins():
+    """
+    :return: a function taking (c_void_p, c_void_p, XUSB_REPORT) and the same taking (c_void_p, c_void_p, c_char_p)
+    """
+    library = ctypes.cdll.msvcrt if sys.platform == 'win32' else ctypes.CDLL(None)
+    name = '_getpid' if sys.platform == 'win32' else 'getpid'
+    by_value, by_pointer = library[name], library[name]
+    by_value.argtypes = (ctypes.c_void_p, ctypes.c_void_p, XUSB_REPORT)
+    by_pointer.argtypes = (ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p)
+    return lambda report: by_value(None, None, report), lambda data: by_pointer(None, None, data)
+
+
+def driver():
+    """
+    :return: the same as stand_ins() for a real device, None if ViGEmBus is not available
+    """
+    try:
+        import vgamepad
+        gamepad = vgamepad.VX360Gamepad()
+    except Exception:
+        return None
+
+    def by_value(report):
+        gamepad.report = report
+        gamepad.update()
+    return by_value, gamepad.update_from_buffer
+
+
+def detached():
+    """
+    :return: a VX360Gamepad that is not plugged in, for timing the methods that only change its report
+    """
+    gamepad = VX360Gamepad.__new__(VX360Gamepad)
+    gamepad._devicep = None
+    gamepad.report = gamepad.get_default_report()
+    return gamepad
+
+
+def per_button(gamepad):
+    # what callers had to do for every frame
+    for button in XUSB_BUTTON:
+        if FIELDS[0] & button:
+            gamepad.press_button(button)
+        else:
+            gamepad.release_button(button)
+    gamepad.left_trigger(FIELDS[1])
+    gamepad.right_trigger(FIELDS[2])
+    gamepad.left_joystick(*FIELDS[3:5])
+    gamepad.right_joystick(*FIELDS[5:7])
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    target = driver()
+    print('target:', 'ViGEmBus' if target else 'ctypes stand-in (no driver)')
+    by_value, by_pointer = target or stand_ins()
+    report = XUSB_REPORT()
+
+    def fields():
+        report.wButtons, report.bLeftTrigger, report.bRightTrigger = FIELDS[:3]
+        report.sThumbLX, report.sThumbLY, report.sThumbRX, report.sThumbRY = FIELDS[3:]
+        by_value(report)
+
+    cases = {
+        'fields + by value': fields,
+        'constructor + by value': lambda: by_value(XUSB_REPORT(*FIELDS)),
+        'pack + copy + by value': lambda: by_value(XUSB_REPORT.from_buffer_copy(PACK(*FIELDS))),
+        'pack + pointer': lambda: by_pointer(PACK(*FIELDS)),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=iterations, repeat=5))
+        print('{:<24} {:8.3f} us/call'.format(name, best / iterations * 1e6))
+
+    gamepad = detached()
+    cases = {
+        'press/release per button': lambda: per_button(gamepad),
+        'set_state': lambda: gamepad.set_state(*FIELDS),
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=iterations // 10, repeat=5))
+        print('{:<24} {:8.3f} us/frame'.format(name, best / (iterations // 10) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
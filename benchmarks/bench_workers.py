@@ -0,0 +1,115 @@
+"""
+Multi-worker throughput
+
+Starts the server headless with 1, 2 and 4 worker processes (STADIA_WORKERS, see
+workers.py) and drives it with many clients, from several client processes so that
+the clients are not the bottleneck. Reports the frames per second the server
+processed in total and per worker, and the ack latency under that load.
+
+Frames are counted from the acks: each one carries the seq of the newest frame
+whose report reached the device, so how far it moved is how many frames the server
+processed, whichever worker has the client.
+
+Usage: python benchmarks/bench_workers.py [--workers 1,2,4] [--clients 32] [--rate 1000]
+                                          [--client-processes 4] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import loadgen  # noqa: E402
+
+
+class Client(loadgen.Client):
+    def __init__(self, url, rate):
+        # a change every frame, so every frame processed moves the acks on
+        super().__init__(url, rate, 'sweep')
+        self.processed = 0
+        self.acked = None
+
+    async def receive(self, websocket):
+        async for message in websocket:
+            message = json.loads(message)
+            if message.get('type') != 'ack':
+                continue
+            seq = message['seq']
+            sent = self.sent.pop(seq, None)
+            if self.measuring:
+                if sent is not None:
+                    self.latencies.append(time.perf_counter() - sent)
+                if self.acked is not None:
+                    self.processed += (seq - self.acked) & 0xFFFF
+            self.acked = seq
+
+
+async def drive(url, clients, rate, duration, warmup):
+    """
+    :return: the frames of `clients` clients the server processed while measuring, and their ack latencies
+    """
+    connected = asyncio.Semaphore(0)
+    stop = asyncio.Event()
+    group = [Client(url, rate) for _ in range(clients)]
+    tasks = [asyncio.create_task(client.run(connected, stop)) for client in group]
+    for _ in group:
+        await connected.acquire()
+    await asyncio.sleep(warmup)
+    for client in group:
+        client.measuring = True
+    await asyncio.sleep(duration)
+    for client in group:
+        client.measuring = False
+    stop.set()
+    await asyncio.gather(*tasks)
+    return sum(client.processed for client in group), [value for client in group for value in client.latencies]
+
+
+def client_process(arguments):
+    return asyncio.run(drive(*arguments))
+
+
+def measure(workers, clients, rate, client_processes, duration, warmup=1.0):
+    process, url = loadgen.start_server(clients, STADIA_WORKERS=str(workers))
+    try:
+        shares = [clients // client_processes + (index < clients % client_processes)
+                  for index in range(client_processes)]
+        with multiprocessing.Pool(client_processes) as clients_pool:
+            results = clients_pool.map(client_process, [(url, share, rate, duration, warmup) for share in shares if share])
+    finally:
+        process.terminate()
+        process.wait()
+    frames = sum(sent for sent, latencies in results)
+    latencies = [value for sent, latencies in results for value in latencies]
+    return {
+        'workers': workers,
+        'clients': clients,
+        'offered_frames_per_second': clients * rate,
+        'frames_per_second': round(frames / duration, 1),
+        'frames_per_second_per_worker': round(frames / duration / workers, 1),
+        'ack_ms': loadgen.percentiles(latencies),
+        'ack_mean_ms': round(statistics.mean(latencies) * 1e3, 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--workers', type=loadgen.integers, default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--rate', type=int, default=1000, help='frames per second sent by each client')
+    parser.add_argument('--client-processes', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds measured per run')
+    args = parser.parse_args()
+    print('cores:', os.cpu_count(), file=sys.stderr)
+    for workers in args.workers:
+        print(json.dumps(measure(workers, args.clients, args.rate, args.client_processes, args.duration)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+End-to-end load generator
+
+Starts the server headless on the loopback backend (or targets a running one with
+--url) and connects synthetic clients that speak the /controller protocol the way
+static/script.js does: a hello, then one binary frame per tick. Clients ask for acks
+so the time from sending a frame to its report reaching the device can be measured,
+and the server's /metrics gives frames received and CPU time spent.
+
+Patterns:
+  idle   the same frame every tick (the server should skip nearly all of them)
+  sweep  both sticks turning in circles and the triggers ramping, a change every frame
+  mash   a different random set of buttons every frame
+
+Each combination of --clients, --rate and --pattern is one run; the results are
+printed as one JSON object per line.
+
+--transport udp sends the frames over UDP (see udp.py) instead of the websocket.
+--scenario runs the clients through netem.py with a scenario file (see
+benchmarks/scenarios), to measure latency and frames lost on a bad network; --jitter
+has the clients ask for the server's jitter buffer (see jitter.py).
+
+Usage: python benchmarks/loadgen.py [--clients 1,4] [--rate 60,120,250,1000]
+                                    [--pattern idle,sweep,mash] [--duration 5] [--url ws://host:port]
+                                    [--transport websocket|udp] [--scenario FILE] [--jitter]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import netem  # noqa: E402
+import protocol  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PATTERNS = ('idle', 'sweep', 'mash')
+METRIC = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def idle(seq, t):
+    return 0, 0, 0, 0, 0, 0, 0
+
+
+def sweep(seq, t):
+    angle = t * 2 * math.pi
+    x, y = int(math.cos(angle) * 32767), int(math.sin(angle) * 32767)
+    trigger = int(t * 255) % 256
+    return 0, trigger, 255 - trigger, x, y, -y, x
+
+
+def mash(seq, t):
+    return random.getrandbits(protocol.BUTTON_COUNT), 0, 0, 0, 0, 0, 0
+
+
+GENERATORS = {'idle': idle, 'sweep': sweep, 'mash': mash}
+
+
+def start_server(max_players, **environment):
+    """
+    :param environment: more environment variables for the server, e.g. STADIA_WORKERS='2'
+    :return: the server process and its websocket URL
+    """
+    env = dict(os.environ, STADIA_BACKEND='loopback', STADIA_TRAY='0', STADIA_RESUME_GRACE='0',
+               STADIA_MAX_PLAYERS=str(max_players), STADIA_POOL_SIZE=str(max_players),
+               PORT='0', PYTHONUNBUFFERED='1', **environment)
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py')], cwd=ROOT, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout:
+        match = re.search(r':(\d+)$', line.strip())
+        if match:
+            break
+    else:
+        raise RuntimeError("The server exited with status {}".format(process.wait()))
+    # keep reading so the server never blocks on a full pipe
+    threading.Thread(target=lambda: process.stdout.read(), daemon=True).start()
+    return process, 'ws://127.0.0.1:{}'.format(match.group(1))
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def scrape(url):
+    """
+    :return: {(name, labels): value} from the server's /metrics
+    """
+    with urllib.request.urlopen(url.replace('ws://', 'http://', 1) + '/metrics') as f:
+        text = f.read().decode()
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC.match(line)
+        if match:
+            samples[match.group(1), match.group(2) or ''] = float(match.group(3))
+    return samples
+
+
+def total(samples, name):
+    return sum(value for (metric, labels), value in samples.items() if metric == name)
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {q: round(values[min(len(values) - 1, int(len(values) * float(q)))] * 1e3, 3)
+            for q in ('0.5', '0.99', '0.999')}
+
+
+class Client:
+    def __init__(self, url, rate, pattern, transport='websocket', udp_address=None, jitter=False):
+        """
+        :param url: the websocket URL of the server (or of a netem proxy)
+        :param rate: frames per second
+        :param pattern: the name of a generator in GENERATORS
+        :param transport: 'websocket', or 'udp' to send the frames as datagrams
+        :param udp_address: where datagrams are sent, None for the port in the server's welcome
+        :param jitter: True to ask for the server's jitter buffer
+        """
+        self.url = url
+        self.rate = rate
+        self.generate = GENERATORS[pattern]
+        self.transport = transport
+        self.udp_address = udp_address
+        self.jitter = jitter
+        self.sent = {}
+        self.latencies = []
+        self.frames = 0
+        self.measuring = False
+
+    async def receive(self, websocket):
+        async for message in websocket:
+            message = json.loads(message)
+            if message.get('type') == 'ack':
+                sent = self.sent.pop(message['seq'], None)
+                if sent is not None and self.measuring:
+                    self.latencies.append(time.perf_counter() - sent)
+
+    async def run(self, connected, stop):
+        async with websockets.connect(self.url + '/controller') as websocket:
+            await websocket.send(json.dumps({'type': 'hello', 'protocol': [protocol.PROTOCOL_VERSION], 'ack': True,
+                                             'jitter': self.jitter}))
+            welcome = json.loads(await websocket.recv())
+            if welcome.get('type') != 'welcome':
+                raise RuntimeError(welcome.get('error', welcome))
+            datagrams = None
+            if self.transport == 'udp':
+                if 'udp_key' not in welcome:
+                    raise RuntimeError("The server has no UDP transport")
+                key = bytes.fromhex(welcome['udp_key'])
+                address = self.udp_address or (urlsplit(self.url).hostname, welcome['udp_port'])
+                datagrams, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                    asyncio.DatagramProtocol, remote_addr=address)
+            connected.release()
+            receiver = asyncio.create_task(self.receive(websocket))
+            interval = 1.0 / self.rate
+            start = deadline = time.perf_counter()
+            seq = 0
+            while not stop.is_set():
+                now = time.perf_counter()
+                seq = (seq + 1) & 0xFFFF
+                frame = protocol.Frame(0, seq, int(now * 1e6) & 0xFFFFFFFF, *self.generate(seq, now - start))
+                # acks echo the seq, which wraps: forget what was never acknowledged
+                self.sent[seq] = now
+                if datagrams is not None:
+                    datagrams.sendto(key + protocol.encode_frame(frame))
+                else:
+                    await websocket.send(protocol.encode_frame(frame))
+                if self.measuring:
+                    self.frames += 1
+                deadline += interval
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    deadline = time.perf_counter()
+                    # behind schedule: still let the other clients and the ack reader run
+                    await asyncio.sleep(0)
+            receiver.cancel()
+            if datagrams is not None:
+                datagrams.close()
+            await websocket.send('disconnect')
+
+
+def stage_mean(before, after, stage):
+    """
+    :return: the mean of a stadia_stage_seconds stage between two scrapes, in ms, None if nothing was recorded
+    """
+    label = 'stage="{}"'.format(stage)
+    count, seconds = (sum(value for (metric, labels), value in after.items() if metric == name and label in labels) -
+                      sum(value for (metric, labels), value in before.items() if metric == name and label in labels)
+                      for name in ('stadia_stage_seconds_count', 'stadia_stage_seconds_sum'))
+    return round(seconds / count * 1e3, 3) if count else None
+
+
+def difference(before, after):
+    if isinstance(after, dict):
+        return {key: difference(before[key], value) for key, value in after.items()}
+    return after - before
+
+
+async def measure(url, clients, rate, pattern, duration, warmup=1.0, proxy=None, transport='websocket',
+                  jitter=False):
+    """
+    :param url: the server's websocket URL, its /metrics are read there
+    :param proxy: a started netem.Proxy the clients go through, None to connect directly
+    :param transport: 'websocket' or 'udp', see Client
+    :param jitter: True for the clients to ask for the jitter buffer
+    """
+    connected = asyncio.Semaphore(0)
+    stop = asyncio.Event()
+    client_url, udp_address = url, None
+    if proxy is not None:
+        client_url = 'ws://127.0.0.1:{}'.format(proxy.port)
+        if proxy.udp_port is not None:
+            udp_address = ('127.0.0.1', proxy.udp_port)
+    group = [Client(client_url, rate, pattern, transport, udp_address, jitter) for _ in range(clients)]
+    tasks = [asyncio.create_task(client.run(connected, stop)) for client in group]
+    for _ in group:
+        await connected.acquire()
+    await asyncio.sleep(warmup)
+    loop = asyncio.get_running_loop()
+    before = await loop.run_in_executor(None, scrape, url)
+    network = proxy.stats() if proxy is not None else None
+    for client in group:
+        client.measuring = True
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    after = await loop.run_in_executor(None, scrape, url)
+    if proxy is not None:
+        network = difference(network, proxy.stats())
+    elapsed = time.perf_counter() - start
+    for client in group:
+        client.measuring = False
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    received = total(after, 'stadia_frames_in_total') - total(before, 'stadia_frames_in_total')
+    submitted = total(after, 'stadia_reports_submitted_total') - total(before, 'stadia_reports_submitted_total')
+    cpu = total(after, 'process_cpu_seconds_total') - total(before, 'process_cpu_seconds_total')
+    dropped = total(after, 'stadia_datagrams_dropped_total') - total(before, 'stadia_datagrams_dropped_total')
+    latencies = [value for client in group for value in client.latencies]
+    sent = sum(client.frames for client in group)
+    return {
+        'clients': clients,
+        'rate': rate,
+        'pattern': pattern,
+        'transport': transport,
+        'scenario': proxy.scenario.get('name') if proxy is not None else None,
+        'seconds': round(elapsed, 3),
+        'frames_sent_per_second': round(sent / elapsed, 1),
+        'frames_received_per_second': round(received / elapsed, 1),
+        # lost on the way, or dropped by the server as late or duplicate (UDP)
+        'frames_lost_percent': round(max(0.0, 1 - received / sent) * 100, 2) if sent else None,
+        'datagrams_dropped_per_second': round(dropped / elapsed, 1),
+        'reports_submitted_per_second': round(submitted / elapsed, 1),
+        'server_cpu_percent': round(cpu / elapsed * 100, 1),
+        'server_cpu_us_per_frame': round(cpu / received * 1e6, 2) if received else None,
+        'ack_ms': percentiles(latencies),
+        'ack_mean_ms': round(statistics.mean(latencies) * 1e3, 3) if latencies else None,
+        'jitter_buffer_mean_ms': stage_mean(before, after, 'jitter') if jitter else None,
+        'network': network,
+    }
+
+
+def integers(text):
+    return [int(value) for value in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--clients', type=integers, default=[1, 4])
+    parser.add_argument('--rate', type=integers, default=[60, 120, 250, 1000])
+    parser.add_argument('--pattern', type=lambda text: text.split(','), default=list(PATTERNS))
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds measured per run')
+    parser.add_argument('--url', help='websocket URL of a running server, e.g. ws://127.0.0.1:8080')
+    parser.add_argument('--transport', choices=('websocket', 'udp'), default='websocket')
+    parser.add_argument('--scenario', help='netem.py scenario file the clients\' traffic goes through')
+    parser.add_argument('--jitter', action='store_true', help="ask for the server's jitter buffer")
+    args = parser.parse_args()
+    for pattern in args.pattern:
+        if pattern not in GENERATORS:
+            parser.error("Unknown pattern {}".format(pattern))
+    if args.url and args.scenario and args.transport == 'udp':
+        parser.error("--scenario with --transport udp needs a server started by loadgen, whose UDP port is known")
+    scenario = netem.load_scenario(args.scenario) if args.scenario else None
+
+    process = None
+    url = args.url
+    udp_port = None
+    if url is None:
+        environment = {}
+        if args.transport == 'udp':
+            udp_port = free_udp_port()
+            environment['STADIA_UDP_PORT'] = str(udp_port)
+        process, url = start_server(max(args.clients), **environment)
+    try:
+        proxy = None
+        if scenario is not None:
+            target = urlsplit(url)
+            proxy = netem.start_in_thread(scenario, (target.hostname, target.port),
+                                          ('127.0.0.1', udp_port) if udp_port else None)
+        for clients in args.clients:
+            for rate in args.rate:
+                for pattern in args.pattern:
+                    result = asyncio.run(measure(url, clients, rate, pattern, args.duration, proxy=proxy,
+                                                 transport=args.transport, jitter=args.jitter))
+                    print(json.dumps(result), flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
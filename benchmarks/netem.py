@@ -0,0 +1,312 @@
+"""
+Network impairment proxy
+
+Sits between synthetic clients and the server on one machine and makes the network
+between them as bad as a scenario file says, so latency and frame drops on poor Wi-Fi
+can be measured reproducibly. A scenario is a JSON object:
+
+  name            shown in the results
+  delay_ms        one-way delay added in each direction
+  jitter_ms       extra random delay, uniform between 0 and jitter_ms
+  loss            probability a packet is lost: a UDP datagram is dropped, a TCP segment
+                  arrives retransmit_ms late, holding back everything behind it
+  retransmit_ms   (TCP) delay of a lost segment, 200 by default
+  reorder         (UDP) probability a datagram is held back behind the next ones
+  reorder_ms      (UDP) how long it is held back, 10 by default
+  bandwidth_kbps  link capacity in each direction, 0 (the default) for unlimited
+  seed            seeds the random numbers, so that runs are repeatable
+
+"up" (client to server) and "down" (server to client) objects override any of these
+for one direction only, e.g. {"delay_ms": 5, "loss": 0.02, "down": {"loss": 0}}.
+Examples are in benchmarks/scenarios.
+
+The websocket is relayed as a TCP byte stream, UDP (see udp.py) datagram by datagram.
+
+Usage: python benchmarks/netem.py SCENARIO --target HOST:PORT [--listen PORT]
+                                  [--udp-target HOST:PORT] [--udp-listen PORT]
+loadgen.py --scenario runs its clients through it.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+
+DEFAULTS = {
+    'delay_ms': 0,
+    'jitter_ms': 0,
+    'loss': 0,
+    'retransmit_ms': 200,
+    'reorder': 0,
+    'reorder_ms': 10,
+    'bandwidth_kbps': 0,
+}
+KEYS = set(DEFAULTS) | {'name', 'seed', 'up', 'down'}
+
+
+def load_scenario(path):
+    """
+    :return: the scenario in the JSON file at `path`
+    :raises ValueError: if it has settings this proxy does not know
+    """
+    with open(path) as f:
+        scenario = json.load(f)
+    for settings in (scenario, scenario.get('up', {}), scenario.get('down', {})):
+        unknown = set(settings) - KEYS
+        if unknown:
+            raise ValueError("Unknown scenario settings: {}".format(', '.join(sorted(unknown))))
+    return scenario
+
+
+class Link:
+    """
+    One direction of the impaired network
+    """
+
+    def __init__(self, scenario, direction, rng):
+        """
+        :param scenario: the scenario
+        :param direction: 'up' or 'down', whose overrides apply
+        :param rng: the random.Random to draw from
+        """
+        settings = dict(DEFAULTS)
+        settings.update((key, value) for key, value in scenario.items() if key in DEFAULTS)
+        settings.update(scenario.get(direction, {}))
+        self.delay = settings['delay_ms'] / 1000
+        self.jitter = settings['jitter_ms'] / 1000
+        self.loss = settings['loss']
+        self.retransmit = settings['retransmit_ms'] / 1000
+        self.reorder = settings['reorder']
+        self.reorder_delay = settings['reorder_ms'] / 1000
+        # bytes per second
+        self.bandwidth = settings['bandwidth_kbps'] * 125
+        self.random = rng
+        self.packets = 0
+        self.lost = 0
+        self.reordered = 0
+        self._busy_until = 0.0
+        self._last_release = 0.0
+
+    def _transmitted(self, now, size):
+        # the time the packet is through the link, after those queued before it
+        if not self.bandwidth:
+            return now
+        self._busy_until = max(now, self._busy_until) + size / self.bandwidth
+        return self._busy_until
+
+    def stream(self, now, size):
+        """
+        :return: when a TCP segment of `size` bytes sent at `now` (loop time) is delivered
+        """
+        self.packets += 1
+        release = self._transmitted(now, size) + self.delay + self.random.uniform(0, self.jitter)
+        if self.random.random() < self.loss:
+            self.lost += 1
+            release += self.retransmit
+        # in order
+        release = self._last_release = max(release, self._last_release)
+        return release
+
+    def datagram(self, now, size):
+        """
+        :return: when a datagram of `size` bytes sent at `now` (loop time) is delivered, None if it is lost
+        """
+        self.packets += 1
+        if self.random.random() < self.loss:
+            self.lost += 1
+            return None
+        release = self._transmitted(now, size) + self.delay + self.random.uniform(0, self.jitter)
+        if self.random.random() < self.reorder:
+            self.reordered += 1
+            release += self.reorder_delay
+        return release
+
+    def stats(self):
+        return {'packets': self.packets, 'lost': self.lost, 'reordered': self.reordered}
+
+
+class _Upstream(asyncio.DatagramProtocol):
+    """
+    The socket one client's datagrams are relayed to the server from, and its replies back
+    """
+
+    def __init__(self, proxy, address):
+        self.proxy = proxy
+        self.address = address
+        self.transport = None
+        # datagrams due before the socket was ready
+        self._waiting = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+        for data in self._waiting:
+            transport.sendto(data)
+        self._waiting = None
+
+    def send(self, data, address=None):
+        if self.transport is None:
+            self._waiting.append(data)
+        else:
+            self.transport.sendto(data)
+
+    def datagram_received(self, data, address):
+        self.proxy.relay(self.proxy.down, self.proxy.listener.sendto, data, self.address)
+
+
+class _Listener(asyncio.DatagramProtocol):
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def datagram_received(self, data, address):
+        self.proxy.forward(data, address)
+
+
+class Proxy:
+    """
+    Relays the websocket (TCP) and optionally UDP traffic of clients to the server through two Links
+    """
+
+    def __init__(self, scenario, target, udp_target=None):
+        """
+        :param scenario: the scenario, see load_scenario()
+        :param target: the server's (host, port)
+        :param udp_target: the (host, port) of the server's UDP transport, None to not relay UDP
+        """
+        self.scenario = scenario
+        self.target = target
+        self.udp_target = udp_target
+        rng = random.Random(scenario.get('seed'))
+        self.up = Link(scenario, 'up', rng)
+        self.down = Link(scenario, 'down', rng)
+        self.port = None
+        self.udp_port = None
+        self.listener = None
+        self._upstreams = {}
+        self._loop = None
+
+    async def start(self, host='127.0.0.1', port=0, udp_port=0):
+        """
+        Listens on `port` (and `udp_port` if UDP is relayed), 0 for any free one; sets self.port and self.udp_port
+        """
+        self._loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._connection, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        if self.udp_target is not None:
+            self.listener, _ = await self._loop.create_datagram_endpoint(lambda: _Listener(self),
+                                                                         local_addr=(host, udp_port))
+            self.udp_port = self.listener.get_extra_info('sockname')[1]
+
+    def stats(self):
+        return {'up': self.up.stats(), 'down': self.down.stats()}
+
+    async def _connection(self, reader, writer):
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            writer.close()
+            return
+        await asyncio.gather(self._pipe(reader, upstream_writer, self.up),
+                             self._pipe(upstream_reader, writer, self.down))
+
+    async def _pipe(self, reader, writer, link):
+        queue = asyncio.Queue()
+        delivery = asyncio.create_task(self._deliver(queue, writer))
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                queue.put_nowait((link.stream(self._loop.time(), len(data)), data))
+        except ConnectionError:
+            pass
+        finally:
+            queue.put_nowait(None)
+            await delivery
+
+    async def _deliver(self, queue, writer):
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                release, data = item
+                delay = release - self._loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def forward(self, data, address):
+        upstream = self._upstreams.get(address)
+        if upstream is None:
+            upstream = self._upstreams[address] = _Upstream(self, address)
+            self._loop.create_task(self._loop.create_datagram_endpoint(lambda: upstream,
+                                                                       remote_addr=self.udp_target))
+        self.relay(self.up, upstream.send, data, None)
+
+    def relay(self, link, send, data, address):
+        release = link.datagram(self._loop.time(), len(data))
+        if release is not None:
+            self._loop.call_at(release, send, data, address)
+
+
+def start_in_thread(scenario, target, udp_target=None):
+    """
+    Runs a Proxy on an event loop of its own, in a daemon thread
+
+    :return: the started Proxy
+    """
+    started = threading.Event()
+    proxy = Proxy(scenario, target, udp_target)
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(proxy.start())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name='netem', daemon=True).start()
+    started.wait()
+    return proxy
+
+
+def address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('scenario', help='scenario JSON file')
+    parser.add_argument('--target', type=address, required=True, help='the server, HOST:PORT')
+    parser.add_argument('--listen', type=int, default=0, help='port clients connect to, any free one by default')
+    parser.add_argument('--udp-target', type=address, help="the server's UDP transport, HOST:PORT")
+    parser.add_argument('--udp-listen', type=int, default=0, help='port clients send datagrams to')
+    args = parser.parse_args()
+
+    async def run():
+        proxy = Proxy(load_scenario(args.scenario), args.target, args.udp_target)
+        await proxy.start(port=args.listen, udp_port=args.udp_listen)
+        print('websocket: ws://127.0.0.1:{}'.format(proxy.port), flush=True)
+        if proxy.udp_port is not None:
+            print('udp: 127.0.0.1:{}'.format(proxy.udp_port), flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            print(json.dumps(proxy.stats()))
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
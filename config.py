@@ -0,0 +1,52 @@
+"""
+Runtime settings, read from the environment
+"""
+
+import os
+
+# Rate (Hz) at which each virtual device's report is pushed to the driver; reports are only
+# sent when they changed. 0 sends every changed report as soon as it arrives.
+OUTPUT_RATE = int(os.environ.get('STADIA_OUTPUT_RATE', '250'))
+
+# Push a report immediately, without waiting for the next tick, when a button changes
+PUSH_ON_EDGE = os.environ.get('STADIA_PUSH_ON_EDGE', '1') != '0'
+
+# Where virtual devices are created: 'vigem' (ViGEmBus driver) or 'loopback' (in memory, no driver)
+BACKEND = os.environ.get('STADIA_BACKEND', 'vigem')
+
+# Number of idle virtual devices kept plugged in, so a connecting phone does not wait for Windows
+# to enumerate a new controller and games do not see it unplugged when it disconnects
+POOL_SIZE = int(os.environ.get('STADIA_POOL_SIZE', '1'))
+
+# Seconds a disconnected phone's controller is kept, so that it gets the same device back if it reconnects
+RESUME_GRACE = float(os.environ.get('STADIA_RESUME_GRACE', '10'))
+
+# Maximum number of phones connected at once, each gets its own virtual controller
+# (XInput games only see the first 4 Xbox 360 controllers)
+MAX_PLAYERS = int(os.environ.get('STADIA_MAX_PLAYERS', '4'))
+
+# Interface and port the web page and /controller websocket are served on (port 0 picks a free one)
+HOST = os.environ.get('STADIA_HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', '0'))
+
+# Port native clients can send their input to over UDP (see udp.py), 0 for any free one, unset to disable
+UDP_PORT = int(os.environ['STADIA_UDP_PORT']) if os.environ.get('STADIA_UDP_PORT') else None
+
+# Set to 0 to run without the system tray icon (e.g. headless test machines)
+TRAY = os.environ.get('STADIA_TRAY', '1') != '0'
+
+# Stick deadzone, response curve and hysteresis profile (see curves.PROFILES), clients can pick another
+PROFILE = os.environ.get('STADIA_PROFILE', 'default')
+
+# Directory each session's reports are recorded to (see recording.py), unset to not record
+RECORD_DIR = os.environ.get('STADIA_RECORD_DIR') or None
+
+# Set to 1 to run the virtual devices in a process of their own, fed through shared memory (see driver_process.py)
+DRIVER_PROCESS = os.environ.get('STADIA_DRIVER_PROCESS', '0') != '0'
+
+# Number of server processes sharing the port (see workers.py), for more controllers than one core can handle
+WORKERS = int(os.environ.get('STADIA_WORKERS', '1'))
+
+# Directory files derived on first launch are cached in (the scaled tray icon), across runs
+CACHE_DIR = os.environ.get('STADIA_CACHE_DIR') or os.path.join(
+    os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'), 'StadiaWireless')
@@ -0,0 +1,126 @@
+"""
+Stick deadzones, response curves and hysteresis
+
+A profile is compiled once into integer lookup tables so that shaping a stick costs
+a table index and an integer multiply per axis:
+
+- axial profiles index a table by the quantized axis value, each axis on its own
+- radial profiles index a gain table by the squared length of the stick vector,
+  which keeps the direction of the stick and needs no square root per frame
+
+Hysteresis keeps the last output while the input stays within a few steps of the
+input it was computed from, so a resting stick's noise does not change the report.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+# deadzone and outer: fractions of full scale below which the stick reads 0 and above which it reads 1
+# curve: exponent applied in between (1 is linear, 2 gives finer control near the center)
+# radial: True for a circular deadzone on the stick vector, False for one per axis
+# hysteresis: input change, in int16 steps, ignored on both axes
+Profile = namedtuple('Profile', 'deadzone outer curve radial hysteresis')
+
+PROFILES = {
+    'raw': Profile(0.0, 1.0, 1.0, False, 0),
+    'default': Profile(0.05, 0.98, 1.0, True, 64),
+    'precise': Profile(0.05, 0.98, 2.0, True, 64),
+    'axial': Profile(0.08, 0.98, 1.0, False, 64),
+}
+
+# axial tables are indexed by the top AXIAL_BITS bits of the axis
+AXIAL_BITS = 12
+AXIAL_SHIFT = 16 - AXIAL_BITS
+# radial gain tables are indexed by x * x + y * y (up to 2 ** 31) >> RADIAL_SHIFT
+RADIAL_SHIFT = 16
+# gains are fixed point
+GAIN_BITS = 16
+
+
+def get_profile(profile):
+    """
+    :param: a Profile, or the name of one in PROFILES
+    :return: the Profile
+    """
+    if isinstance(profile, Profile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError("Unknown profile {!r}, expected one of {}".format(profile, ', '.join(PROFILES)))
+    return PROFILES[profile]
+
+
+def _magnitude(profile, r):
+    """
+    :param: the input magnitude, in [0, 1]
+    :return: the output magnitude, in [0, 1]
+    """
+    if r <= profile.deadzone:
+        return 0.0
+    if r >= profile.outer:
+        return 1.0
+    return ((r - profile.deadzone) / (profile.outer - profile.deadzone)) ** profile.curve
+
+
+@lru_cache(maxsize=None)
+def compile_axial(profile):
+    """
+    :return: a table from (axis + 32768) >> AXIAL_SHIFT to the shaped int16 axis
+    """
+    table = []
+    for index in range(1 << AXIAL_BITS):
+        # the center of the quantization step
+        value = ((index << AXIAL_SHIFT) + (1 << AXIAL_SHIFT) // 2 - 32768) / 32767
+        shaped = _magnitude(profile, min(abs(value), 1.0)) * 32767
+        table.append(int(round(shaped if value >= 0 else -shaped)))
+    return tuple(table)
+
+
+@lru_cache(maxsize=None)
+def compile_radial(profile):
+    """
+    :return: a table from (x * x + y * y) >> RADIAL_SHIFT to the fixed point gain applied to both axes
+    """
+    table = []
+    for index in range((2 * 32768 * 32768 >> RADIAL_SHIFT) + 1):
+        r = (((index << RADIAL_SHIFT) + (1 << RADIAL_SHIFT) // 2) ** 0.5) / 32767
+        table.append(int(round(_magnitude(profile, min(r, 1.0)) / r * (1 << GAIN_BITS))))
+    return tuple(table)
+
+
+class Stick:
+    """
+    Shapes the two axes of one stick, holds the hysteresis state so there is one per stick per session
+    """
+
+    def __init__(self, profile='default'):
+        """
+        :param: a Profile, or the name of one in PROFILES
+        """
+        self.profile = profile = get_profile(profile)
+        self.hysteresis = profile.hysteresis
+        self.raw = profile == PROFILES['raw']
+        self.axial = None if profile.radial else compile_axial(profile)
+        self.radial = compile_radial(profile) if profile.radial else None
+        self._input = None
+        self._output = (0, 0)
+
+    def shape(self, x, y):
+        """
+        :param x: int16 axis
+        :param y: int16 axis
+        :return: the shaped (x, y), int16
+        """
+        if self.raw:
+            return x, y
+        last = self._input
+        if last is not None and abs(x - last[0]) <= self.hysteresis and abs(y - last[1]) <= self.hysteresis:
+            return self._output
+        self._input = x, y
+        if self.radial is not None:
+            gain = self.radial[(x * x + y * y) >> RADIAL_SHIFT]
+            output = (x * gain) >> GAIN_BITS, (y * gain) >> GAIN_BITS
+        else:
+            table = self.axial
+            output = table[(x + 32768) >> AXIAL_SHIFT], table[(y + 32768) >> AXIAL_SHIFT]
+        self._output = output
+        return output
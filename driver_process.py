@@ -0,0 +1,400 @@
+"""
+Driver process
+
+Runs the virtual devices and their output schedulers in a process of their own, so
+that socket and HTTP work in the server process (and its GIL) cannot delay a call to
+the driver, and the driver side gets a core of its own.
+
+Reports cross over through shared memory: one ring per player slot, written by the
+server process and read by the driver process, without locks. The wake-up is not
+lock-free though: each submitted report sets a multiprocessing.Event, whose set()
+takes a lock (a semaphore) shared by both processes. Control messages (open and
+close a slot, turn acks on) go over a pipe; feedback, acks and statistics come back
+over another. In the server process, DriverProcess stands in for the device pool and
+RemoteOutput for each session's scheduler.OutputScheduler.
+"""
+
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import metrics
+import startup
+from vgamepad.win.vigem_commons import VIGEM_TARGET_TYPE
+
+# Places per player ring; a driver process more than RING_SIZE - 1 reports behind loses the oldest
+# (the place of the next report cannot be trusted, the producer may be writing it)
+RING_SIZE = 64
+# Count of reports ever written to the ring, alone on its cache line
+HEAD = struct.Struct('<Q')
+ENTRIES_OFFSET = 64
+# received (time.perf_counter_ns(), 0 if unknown), seq, flags, report length, report bytes
+ENTRY = struct.Struct('<QHBB4x16s')
+HAS_SEQ = 0x01
+SLOT_SIZE = ENTRIES_OFFSET + RING_SIZE * ENTRY.size
+
+# Seconds between statistics updates sent to the server process
+STATS_INTERVAL = 1.0
+
+
+class Ring:
+    """
+    Single producer, single consumer queue of one player's reports in shared memory
+
+    The producer never waits: a full ring overwrites its oldest entries, and the
+    consumer drops entries that were overwritten, or could have been being
+    overwritten, before or while it read them.
+    """
+
+    def __init__(self, buffer, slot):
+        """
+        :param buffer: the shared memory
+        :param slot: the player slot, which ring of the buffer to use
+        """
+        self.buffer = buffer
+        self.base = slot * SLOT_SIZE
+        self.position = self._head()
+
+    def _head(self):
+        return HEAD.unpack_from(self.buffer, self.base)[0]
+
+    def put(self, report, received=None, seq=None):
+        """
+        Appends a report (producer side)
+
+        :param report: the report's bytes
+        :param received: time.perf_counter_ns() when its frame arrived, for latency statistics
+        :param seq: its frame's sequence number
+        """
+        head = self.position
+        ENTRY.pack_into(self.buffer, self.base + ENTRIES_OFFSET + head % RING_SIZE * ENTRY.size,
+                        received or 0, seq or 0, 0 if seq is None else HAS_SEQ, len(report), report)
+        # publishes the entry
+        HEAD.pack_into(self.buffer, self.base, head + 1)
+        self.position = head + 1
+
+    def skip(self):
+        """
+        Drops any unread reports (consumer side)
+        """
+        self.position = self._head()
+
+    def take(self):
+        """
+        Reads the new reports (consumer side)
+
+        :return: a list of (report, received or None, seq or None), and the number of reports lost
+        """
+        head = self._head()
+        tail = self.position
+        if head == tail:
+            return (), 0
+        lost = max(0, head - tail - RING_SIZE)
+        tail += lost
+        entries = []
+        for index in range(tail, head):
+            received, seq, flags, length, report = ENTRY.unpack_from(
+                self.buffer, self.base + ENTRIES_OFFSET + index % RING_SIZE * ENTRY.size)
+            entries.append((report[:length], received or None, seq if flags & HAS_SEQ else None))
+        # entries the producer came back around to while they were being read; entry head - RING_SIZE
+        # shares its place with entry head, which the producer can be writing before publishing head + 1
+        overwritten = self._head() + 1 - RING_SIZE - tail
+        if overwritten > 0:
+            lost += overwritten
+            del entries[:overwritten]
+        self.position = head
+        return entries, lost
+
+
+def _histogram_state(histogram):
+    return {index: count for index, count in enumerate(histogram.counts) if count}, histogram.count, histogram.total
+
+
+def _load_histogram(histogram, state):
+    counts, histogram.count, histogram.total = state
+    histogram.counts = [0] * len(histogram.counts)
+    for index, count in counts.items():
+        histogram.counts[index] = count
+
+
+def _feedback(send, slot):
+    # vgamepad checks the parameter names of notification callbacks
+    def feedback(client, target, large_motor, small_motor, led_number, user_data):
+        send(('feedback', slot, large_motor, small_motor, led_number))
+    return feedback
+
+
+def _ack(send, slot):
+    # bound to its slot, not to serve()'s loop variable
+    def ack(seq):
+        send(('ack', slot, seq))
+    return ack
+
+
+def _pump(rings, outputs, lock, wake, send):
+    """
+    Moves reports from the rings to the schedulers as soon as the server process signals new ones
+    """
+    last_stats = time.perf_counter()
+    while True:
+        wake.wait(STATS_INTERVAL)
+        # cleared before reading, so a report written meanwhile sets it again
+        wake.clear()
+        with lock:
+            for slot, (device, output) in outputs.items():
+                entries, lost = rings[slot].take()
+                for report, received, seq in entries:
+                    output.submit(report, received, seq)
+            now = time.perf_counter()
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                for slot, (device, output) in outputs.items():
+                    send(('stats', slot, output.submitted, output.skipped,
+                          _histogram_state(output.submit_time), _histogram_state(output.latency)))
+
+
+def serve(name, players, backend, pool_size, rate, push_on_edge, control, events, wake):
+    """
+    Main function of the driver process
+    """
+    import backends
+    import pool
+    import recording
+    import scheduler
+
+    memory = shared_memory.SharedMemory(name=name)
+    rings = [Ring(memory.buf, slot) for slot in range(players)]
+    devices = pool.DevicePool(backends.create_backend(backend), pool_size)
+    outputs = {}
+    lock = threading.Lock()
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            events.send(message)
+
+    def fill():
+        devices.fill()
+        send(('ready', None))
+
+    threading.Thread(target=fill, name='device-pool', daemon=True).start()
+
+    threading.Thread(target=_pump, args=(rings, outputs, lock, wake, send), name='ring-reader', daemon=True).start()
+    while True:
+        try:
+            message = control.recv()
+        except EOFError:
+            break  # the server process is gone
+        command = message[0]
+        if command == 'open':
+            _, slot, target_type, record_path = message
+            target_type = VIGEM_TARGET_TYPE(target_type)
+            try:
+                device = devices.acquire(target_type)
+            except Exception as e:
+                send(('failed', slot, str(e)))
+                continue
+            recorder = recording.Recorder(record_path, target_type) if record_path else None
+            output = scheduler.OutputScheduler(device, rate, push_on_edge, name='output-scheduler-{}'.format(slot),
+                                               recorder=recorder)
+            device.register_notification(callback_function=_feedback(send, slot))
+            with lock:
+                # reports of the slot's previous session
+                rings[slot].skip()
+                outputs[slot] = device, output
+            send(('opened', slot))
+        elif command == 'close':
+            with lock:
+                device, output = outputs.pop(message[1])
+            output.close()
+            devices.release(device)
+        elif command == 'ack':
+            _, slot, enabled = message
+            with lock:
+                device, output = outputs[slot]
+            output.on_submit = _ack(send, slot) if enabled else None
+        elif command == 'stop':
+            break
+    with lock:
+        for device, output in outputs.values():
+            output.close()
+            devices.release(device)
+        outputs.clear()
+    del rings
+    memory.close()
+
+
+class RemoteDevice:
+    """
+    Stands in for a device of the driver process: forwards its feedback notifications
+    """
+
+    def __init__(self, target_type):
+        self.target_type = target_type
+        self.callback = None
+
+    def get_type(self):
+        return self.target_type
+
+    def register_notification(self, callback_function):
+        self.callback = callback_function
+
+    def unregister_notification(self):
+        self.callback = None
+
+
+class RemoteOutput:
+    """
+    Stands in for the scheduler.OutputScheduler of a session, which runs in the driver process
+    """
+
+    def __init__(self, driver, slot, ring):
+        self.driver = driver
+        self.slot = slot
+        self.submitted = 0
+        self.skipped = 0
+        # updated from the driver process every STATS_INTERVAL
+        self.submit_time = metrics.Histogram()
+        self.latency = metrics.Histogram()
+        self._ring = ring
+        self._on_submit = None
+
+    @property
+    def on_submit(self):
+        return self._on_submit
+
+    @on_submit.setter
+    def on_submit(self, callback):
+        self._on_submit = callback
+        self.driver.send(('ack', self.slot, callback is not None))
+
+    def submit(self, report, received=None, seq=None):
+        """
+        Queues a report for the driver process, see scheduler.OutputScheduler.submit
+        """
+        self._ring.put(bytes(report), received, seq)
+        self.driver.wake.set()
+
+    def flush(self):
+        pass  # the driver process sends reports as it reads them
+
+    def close(self):
+        self.driver.send(('close', self.slot))
+
+
+class DriverProcess:
+    """
+    Starts the driver process, and stands in for its pool.DevicePool in the server process
+    """
+
+    def __init__(self, backend='vigem', pool_size=1, players=4, rate=250, push_on_edge=True):
+        """
+        :param backend: the name of the backends.Backend the driver process creates devices on
+        :param pool_size: see pool.DevicePool
+        :param players: number of player slots
+        :param rate: output rate of each scheduler.OutputScheduler
+        :param push_on_edge: see scheduler.OutputScheduler
+        """
+        # the same on every platform, and safe with the threads already running
+        context = multiprocessing.get_context('spawn')
+        self.memory = shared_memory.SharedMemory(create=True, size=players * SLOT_SIZE)
+        self.wake = context.Event()
+        control, self._control = context.Pipe(duplex=False)
+        self._events, events = context.Pipe(duplex=False)
+        self.process = context.Process(target=serve, name='stadia-driver', daemon=True,
+                                       args=(self.memory.name, players, backend, pool_size, rate, push_on_edge,
+                                             control, events, self.wake))
+        self.process.start()
+        control.close()
+        events.close()
+        self._rings = [Ring(self.memory.buf, slot) for slot in range(players)]
+        self._devices = {}
+        self._outputs = {}
+        self._replies = {}
+        self._replied = threading.Condition()
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._receive, name='driver-events', daemon=True).start()
+
+    def send(self, message):
+        with self._send_lock:
+            self._control.send(message)
+
+    def fill(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired, background=False):
+        pass  # the driver process fills its pool as it starts
+
+    def acquire(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        """
+        :return: a RemoteDevice, given a device in the driver process by create_output()
+        """
+        return RemoteDevice(target_type)
+
+    def release(self, device):
+        device.unregister_notification()
+
+    def create_output(self, device, slot, record_path=None):
+        """
+        Leases a device in the driver process for a session, the `outputs` of a sessions.SessionManager
+
+        :param device: the RemoteDevice from acquire()
+        :param slot: the session's player slot
+        :param record_path: where the driver process records the reports to, None to not record
+        :return: a RemoteOutput
+        """
+        with self._replied:
+            self._replies.pop(slot, None)
+        self._devices[slot] = device
+        self.send(('open', slot, int(device.get_type()), record_path))
+        with self._replied:
+            self._replied.wait_for(lambda: slot in self._replies or not self.process.is_alive())
+            reply = self._replies.pop(slot, ('failed', slot, "The driver process exited"))
+        if reply[0] == 'failed':
+            raise Exception(reply[2])
+        output = RemoteOutput(self, slot, self._rings[slot])
+        self._outputs[slot] = output
+        return output
+
+    def close(self):
+        """
+        Stops the driver process, unplugging its devices
+        """
+        if self.process.is_alive():
+            self.send(('stop',))
+            self.process.join(5)
+        del self._rings
+        self.memory.close()
+        self.memory.unlink()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._events.recv()
+            except (EOFError, OSError):
+                with self._replied:
+                    self._replied.notify_all()
+                return
+            kind, slot = message[0], message[1]
+            if kind == 'feedback':
+                device = self._devices.get(slot)
+                callback = device.callback if device is not None else None
+                if callback is not None:
+                    callback(None, None, *message[2:], None)
+            elif kind == 'ack':
+                output = self._outputs.get(slot)
+                callback = output.on_submit if output is not None else None
+                if callback is not None:
+                    callback(message[2])
+            elif kind == 'stats':
+                output = self._outputs.get(slot)
+                if output is not None:
+                    output.submitted, output.skipped = message[2:4]
+                    _load_histogram(output.submit_time, message[4])
+                    _load_histogram(output.latency, message[5])
+            elif kind == 'ready':
+                # the devices of the pool are attached
+                startup.mark('driver ready')
+            else:
+                with self._replied:
+                    self._replies[slot] = message
+                    self._replied.notify_all()
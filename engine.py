@@ -0,0 +1,327 @@
+"""
+Asyncio server engine
+
+Serves the controller page, its static assets and the /controller websocket from a
+single event loop. Each socket is handled as messages arrive instead of by a thread
+polling it.
+"""
+
+import asyncio
+import functools
+import ipaddress
+import json
+import math
+import mimetypes
+import os
+import re
+import sys
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import websockets
+
+import curves
+import metrics
+import protocol
+import sessions
+import startup
+import udp
+
+# PyInstaller unpacks the static and templates folders next to the code
+ROOT = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+STATIC = os.path.join(ROOT, 'static')
+TEMPLATES = os.path.join(ROOT, 'templates')
+
+
+def response(body, content_type='text/plain; charset=utf-8', status=HTTPStatus.OK):
+    """
+    :return: an HTTP response as expected from websockets' process_request
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    return status, [('Content-Type', content_type), ('Cache-Control', 'no-cache')], body
+
+
+def file_response(path):
+    try:
+        with open(path, 'rb') as f:
+            body = f.read()
+    except OSError:
+        return response('Not Found', status=HTTPStatus.NOT_FOUND)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return response(body, content_type)
+
+
+def is_local(address):
+    """
+    :param: a client's (host, port, ...) address
+    :return: True if the client runs on this machine
+    """
+    try:
+        ip = ipaddress.ip_address(address[0])
+    except (TypeError, ValueError, IndexError):
+        return False
+    if getattr(ip, 'ipv4_mapped', None) is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_loopback
+
+
+class Connection(websockets.WebSocketServerProtocol):
+    """
+    A connection whose plain HTTP requests go to Engine.process_request along with the client's address
+    """
+
+    def __init__(self, *args, engine, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engine = engine
+
+    async def process_request(self, path, request_headers):
+        return await self.engine.process_request(path, request_headers, self.remote_address)
+
+
+class Engine:
+    def __init__(self, players, translators, profiler=None):
+        """
+        :param players: the sessions.SessionManager connections are routed to
+        :param translators: called with no argument, or a curves profile name a client asked for,
+                            to build the translation.X360Translator (or DS4Translator) of a session
+        :param profiler: the profiler.Profiler controlled by /profile, None to not serve it
+        """
+        self.players = players
+        self.translators = translators
+        self.profiler = profiler
+        self.udp = None
+        self.udp_port = None
+        self.routes = {
+            '/': self.index,
+            '/slots': self.slots,
+            '/metrics': self.metrics,
+        }
+        # routes only served to clients on this machine, the server listens on every interface
+        self.local_routes = set()
+        if profiler is not None:
+            self.routes['/profile'] = self.profile
+            # each request writes a file next to the executable
+            self.local_routes.add('/profile')
+
+    def index(self, query):
+        return file_response(os.path.join(TEMPLATES, 'index.html'))
+
+    def slots(self, query):
+        return response(json.dumps(self.players.slots()), 'application/json')
+
+    def metrics(self, query):
+        return response(metrics.render(self.players.sessions()), 'text/plain; version=0.0.4; charset=utf-8')
+
+    def profile(self, query):
+        """
+        /profile?seconds=N samples the server for N seconds (10 by default), /profile?stop ends it early
+        """
+        query = parse_qs(query, keep_blank_values=True)
+        if 'stop' in query:
+            return response(json.dumps({'profiling': False, 'path': self.profiler.stop()}), 'application/json')
+        try:
+            seconds = float(query.get('seconds', ['10'])[0])
+        except ValueError:
+            return response('Bad Request', status=HTTPStatus.BAD_REQUEST)
+        if not math.isfinite(seconds) or seconds <= 0:
+            return response('Bad Request', status=HTTPStatus.BAD_REQUEST)
+        seconds = min(seconds, 600)
+        if not self.profiler.start(seconds):
+            return response(json.dumps({'profiling': True, 'path': self.profiler.path}), 'application/json',
+                            HTTPStatus.CONFLICT)
+        return response(json.dumps({'profiling': True, 'seconds': seconds, 'path': self.profiler.path}),
+                        'application/json')
+
+    def static(self, path):
+        # static files are served from the site root, as Flask did with static_url_path=''
+        full_path = os.path.normpath(os.path.join(STATIC, path.lstrip('/')))
+        if not full_path.startswith(STATIC + os.sep):
+            return response('Not Found', status=HTTPStatus.NOT_FOUND)
+        return file_response(full_path)
+
+    async def process_request(self, path, request_headers, remote_address=None):
+        """
+        Answers plain HTTP requests; returns None to let /controller go on with the websocket handshake
+
+        :param remote_address: the client's address, see Connection
+        """
+        startup.mark('first request')
+        # the request target is a path, never a URL: urlsplit() would take '//controller' (which older
+        # pages ask for, as Flask accepted it) for a host name
+        path, _, query = path.partition('?')
+        path = re.sub('/{2,}', '/', path)
+        if path == '/controller':
+            return None
+        if path in self.local_routes and (remote_address is None or not is_local(remote_address)):
+            return response('Forbidden', status=HTTPStatus.FORBIDDEN)
+        route = self.routes.get(path)
+        if route is not None:
+            return route(query)
+        return self.static(path)
+
+    async def drain(self, websocket, session, reader):
+        """
+        Sends a session's notifications on its connection's loop, never on the driver's thread
+        """
+        while True:
+            batch = await session.mailbox.get(reader)
+            if batch is None:
+                return
+            for kind, value in batch:
+                if kind == 'feedback' and session.udp_address is not None:
+                    # the client sends its input over UDP, rumble goes back the same way
+                    self.udp.feedback(session, value)
+                    continue
+                if kind == 'ack':
+                    value = {'type': 'ack', 'seq': value}
+                await websocket.send(json.dumps(value))
+
+    async def blocking(self, function, *args):
+        """
+        Runs a call that can wait on the driver (creating or releasing a device, a round trip to
+        the driver process) in a thread, so that the other players' input keeps flowing meanwhile
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def attach(self, session, websocket):
+        reader = session.mailbox.attach(asyncio.get_running_loop())
+        return asyncio.create_task(self.drain(websocket, session, reader))
+
+    def input(self, session, frame, received, decoded):
+        """
+        Translates a frame and queues its report, from either transport
+
+        :param session: the sessions.Session the frame belongs to
+        :param frame: the protocol.Frame
+        :param received: time.perf_counter_ns() when it arrived
+        :param decoded: time.perf_counter_ns() when it was decoded
+        """
+        stats = session.metrics
+        stats.frames_in += 1
+        stats.decode.record(decoded - received)
+        if session.jitter is not None:
+            # only button changes are sent now, the rest on the scheduler's ticks
+            report = session.jitter.push(frame, received)
+            stats.jitter.record(session.jitter.delay)
+        else:
+            report = session.translator.translate(frame)
+        stats.translate.record(time.perf_counter_ns() - decoded)
+        if report is not None:
+            session.output.submit(report, received, frame.seq)
+
+    def decode(self, message):
+        """
+        :param: a websocket message
+        :return: (the protocol.Frame it carries, None) or (None, the control message), (None, None) to ignore it
+        :raises protocol.ProtocolError, ValueError, KeyError, TypeError, OverflowError: if the message is
+                malformed
+        """
+        if isinstance(message, bytes):
+            return protocol.decode_frame(message), None
+        if not message.startswith('{'):
+            return None, None
+        message = json.loads(message)
+        if not protocol.is_control(message):
+            return protocol.frame_from_message(message), None
+        if message['type'] == 'hello':
+            resume = message.get('resume')
+            profile = message.get('profile')
+            return None, dict(message, version=protocol.negotiate(message),
+                              resume=resume if isinstance(resume, str) else None,
+                              profile=profile if isinstance(profile, str) else None)
+        if message['type'] == 'stats':
+            return None, dict(message, pollRate=float(message.get('pollRate', 0)))
+        return None, message
+
+    async def controller(self, websocket):
+        session = None
+        drain = None
+        try:
+            async for message in websocket:
+                received = time.perf_counter_ns()
+                if message == 'disconnect':
+                    if session is not None:
+                        await self.blocking(self.players.close, session)
+                        session = None
+                    break
+                try:
+                    frame, message = self.decode(message)
+                except (protocol.ProtocolError, ValueError, KeyError, TypeError, OverflowError):
+                    continue  # one malformed message does not cost the player their controller
+                if message is not None:
+                    if message['type'] == 'hello' and session is None:
+                        session = await self.blocking(self.players.open, websocket, message['resume'])
+                        startup.mark('first controller')
+                        drain = self.attach(session, websocket)
+                        session.acknowledge(bool(message.get('ack')))
+                        # until the new client sends a datagram
+                        session.udp_address = None
+                        if message['profile'] in curves.PROFILES:
+                            session.translator = self.translators(message['profile'])
+                        elif session.translator is None:
+                            session.translator = self.translators()
+                        extra = {}
+                        if session.smooth(bool(message.get('jitter'))):
+                            extra['jitter'] = True
+                        if self.udp is not None:
+                            extra.update(udp_port=self.udp_port, udp_key=session.udp_key.hex())
+                        await websocket.send(protocol.welcome(message['version'],
+                                                              token=session.token, slot=session.slot, **extra))
+                    elif message['type'] == 'stats' and session is not None:
+                        session.metrics.poll_rate = message['pollRate']
+                    continue
+                if frame is None:
+                    continue
+                decoded = time.perf_counter_ns()
+                if session is None:
+                    # legacy clients do not say hello
+                    session = await self.blocking(self.players.open, websocket)
+                    startup.mark('first controller')
+                    drain = self.attach(session, websocket)
+                    session.translator = self.translators()
+                self.input(session, frame, received, decoded)
+        except sessions.SlotsFull as e:
+            print(e)
+            await websocket.send(json.dumps({'type': 'error', 'error': str(e)}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            print("Disconnected")
+            if drain is not None:
+                drain.cancel()
+            if session is not None:
+                # with no grace period, this closes the session: see blocking()
+                await self.blocking(self.players.detach, session, websocket)
+
+    async def serve(self, host, port, stop, ready=None, udp_port=None, sock=None):
+        """
+        Serves until `stop` is set
+
+        :param host: the interface to listen on, also the UDP transport's when `sock` is given
+        :param port: the port, 0 for any free one
+        :param stop: an asyncio.Event
+        :param ready: called with the listening port once connections are accepted
+        :param udp_port: the port of the UDP transport (see udp.py), 0 for any free one, None for none
+        :param sock: a listening socket to accept connections from instead of host and port (see workers.py)
+        """
+        transport = None
+        if udp_port is not None:
+            transport, self.udp = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: udp.DatagramServer(self), local_addr=(host, udp_port))
+            self.udp_port = transport.get_extra_info('sockname')[1]
+        listener = {'sock': sock} if sock is not None else {'host': host, 'port': port}
+        try:
+            async with websockets.serve(self.controller, create_protocol=functools.partial(Connection, engine=self),
+                                        **listener) as server:
+                if ready is not None:
+                    ready(server.sockets[0].getsockname()[1])
+                # the default profile's tables are compiled once the page is served, still before most
+                # clients connect, off the loop so that a request meanwhile is answered
+                await asyncio.get_running_loop().run_in_executor(None, self.translators)
+                startup.mark('profile compiled')
+                await stop.wait()
+        finally:
+            if transport is not None:
+                transport.close()
@@ -0,0 +1,129 @@
+"""
+Adaptive jitter buffer
+
+On congested Wi-Fi frames arrive in bursts, so the game sees the stick jump and then
+freeze. A jitter buffer holds frames for a short playout delay and plays them out at
+the pace the client produced them, going by each frame's timestamp:
+
+- a frame's transit time (arrival minus client timestamp) above the lowest one seen
+  recently is its jitter
+- the playout delay follows the mean and deviation of the jitter, like TCP's
+  retransmission timeout, so a clean network adds next to nothing
+- on each tick of the output scheduler, the sticks and triggers are interpolated
+  between the two frames around the playout time
+- buttons are not delayed: a change is sent as soon as it arrives, with the sticks
+  as last played out
+"""
+
+import threading
+from collections import deque
+
+# Upper bound of the playout delay (ns)
+MAX_DELAY = 100 * 1000000
+# Weight of a new frame in the jitter mean and deviation, and in the frame interval
+GAIN = 1 / 16
+# Playout delay = mean jitter + DEVIATIONS * its mean deviation
+DEVIATIONS = 4
+# The lowest transit time is forgotten this fast (ns per ns), which follows clock drift
+BASELINE_CREEP = 1e-3
+# Longer gaps between frames (ns) are a controller at rest, not the client's polling interval
+MAX_INTERVAL = 50 * 1000000
+# Frames buffered at most, far more than MAX_DELAY holds at any polling rate
+MAX_FRAMES = 256
+
+AXES = ('lt', 'rt', 'lx', 'ly', 'rx', 'ry')
+
+
+class JitterBuffer:
+    """
+    Plays out the frames of one session, see scheduler.OutputScheduler.sample
+    """
+
+    def __init__(self, translator):
+        """
+        :param: the translation.X360Translator (or DS4Translator) reports are built with
+        """
+        self.translator = translator
+        # current playout delay (ns)
+        self.delay = 0
+        self._lock = threading.Lock()
+        # (client time in ns, frame, arrival), oldest first
+        self._frames = deque(maxlen=MAX_FRAMES)
+        self._timestamp = None
+        self._client_time = 0
+        self._arrival = None
+        self._baseline = None
+        self._jitter = 0.0
+        self._deviation = 0.0
+        self._interval = None
+        self._buttons = None
+        self._presented = None
+
+    def push(self, frame, received):
+        """
+        Buffers a frame
+
+        :param frame: the protocol.Frame
+        :param received: time.perf_counter_ns() when it arrived
+        :return: the report to send now if the frame changes the buttons (or is the first one), otherwise None
+        """
+        with self._lock:
+            if self._timestamp is not None:
+                step = (frame.timestamp - self._timestamp) & 0xFFFFFFFF
+                if step >= 0x80000000:
+                    return None  # older than the newest frame
+                step *= 1000
+                if 0 < step < MAX_INTERVAL:
+                    self._interval = step if self._interval is None else self._interval + (step - self._interval) * GAIN
+                self._client_time += step
+            self._timestamp = frame.timestamp
+            transit = received - self._client_time
+            if self._baseline is None:
+                self._baseline = transit
+            else:
+                self._baseline = min(transit, self._baseline + (received - self._arrival) * BASELINE_CREEP)
+            self._arrival = received
+            jitter = transit - self._baseline
+            self._jitter += (jitter - self._jitter) * GAIN
+            self._deviation += (abs(jitter - self._jitter) - self._deviation) * GAIN
+            self.delay = min(int(self._jitter + DEVIATIONS * self._deviation), MAX_DELAY)
+            self._frames.append((self._client_time, frame, received))
+            if frame.buttons == self._buttons:
+                return None
+            self._buttons = frame.buttons
+            presented = frame if self._presented is None else self._presented._replace(buttons=frame.buttons)
+            self._presented = presented
+            return self.translator.translate(presented)
+
+    def sample(self, now):
+        """
+        Plays out the state at `now` minus the playout delay
+
+        :param: time.perf_counter_ns()
+        :return: (report, arrival of its frame, seq of its frame), None if nothing changed
+        """
+        with self._lock:
+            frames = self._frames
+            if not frames:
+                return None
+            # in the client's clock
+            t = now - self._baseline - self.delay
+            while len(frames) > 1 and frames[1][0] <= t:
+                frames.popleft()
+            start, frame, received = frames[0]
+            values = [getattr(frame, axis) for axis in AXES]
+            if len(frames) > 1 and t > start:
+                end, following, arrival = frames[1]
+                # a client only sends changes: the state was the older frame's until one interval before the newer
+                ramp = min(end - start, int(self._interval or end - start)) or 1
+                weight = (t - (end - ramp)) / ramp
+                if weight > 0:
+                    values = [int(value + (getattr(following, axis) - value) * weight)
+                              for value, axis in zip(values, AXES)]
+                    frame, received = following, arrival
+            presented = frame._replace(buttons=self._buttons, **dict(zip(AXES, values)))
+            # buttons and axes, the rest does not reach the report
+            if self._presented is not None and presented[3:] == self._presented[3:]:
+                return None
+            self._presented = presented
+            return self.translator.translate(presented), received, frame.seq
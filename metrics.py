@@ -0,0 +1,146 @@
+"""
+Hot path instrumentation
+
+Durations are taken with time.perf_counter_ns() at each stage of a frame's way from
+the socket to the driver and kept in per-session log-linear histograms, cheap enough
+to stay on all the time. render() formats them for Prometheus.
+"""
+
+import time
+
+import startup
+
+QUANTILES = (0.5, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    HDR-style histogram of non-negative integers (nanoseconds here)
+
+    Values below 2 ** sub_bits are counted exactly, larger ones in buckets whose width
+    is a constant fraction of their value (about 3% with the default 5 sub bits).
+    Updates are not locked: a concurrent record() can rarely be lost, which is fine for
+    statistics and keeps record() cheap.
+    """
+
+    def __init__(self, sub_bits=5, max_bits=40):
+        """
+        :param sub_bits: precision, each power of two is split in 2 ** (sub_bits - 1) buckets
+        :param max_bits: values are clamped to 2 ** max_bits - 1 (about 18 minutes in ns)
+        """
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.max_value = (1 << max_bits) - 1
+        self.counts = [0] * self._index(self.max_value) + [0]
+        self.count = 0
+        self.total = 0
+
+    def _index(self, value):
+        shift = value.bit_length() - self.sub_bits
+        if shift <= 0:
+            return value
+        return (shift + 1) * self.half + (value >> shift) - self.half
+
+    def _value(self, index):
+        """
+        :return: the lowest value counted in bucket `index`
+        """
+        if index < 2 * self.half:
+            return index
+        shift = index // self.half - 1
+        return (index % self.half + self.half) << shift
+
+    def record(self, value):
+        if value > self.max_value:
+            value = self.max_value
+        elif value < 0:
+            value = 0
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q):
+        """
+        :param: a quantile in [0, 1]
+        :return: the middle of the bucket holding it, 0 if nothing was recorded
+        """
+        if not self.count:
+            return 0
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low = self._value(index)
+                return (low + self._value(index + 1)) / 2 if index + 1 < len(self.counts) else low
+        return self.max_value
+
+
+class SessionMetrics:
+    """
+    Counters and stage histograms of one session (the driver call itself is timed by its scheduler)
+    """
+
+    def __init__(self):
+        self.frames_in = 0
+        self.datagrams_dropped = 0
+        # gamepad polling rate achieved by the client, as it last reported it
+        self.poll_rate = None
+        self.decode = Histogram()
+        self.translate = Histogram()
+        # playout delay of the jitter buffer as each frame arrived, when the client asked for one
+        self.jitter = Histogram()
+
+
+def _summary(lines, name, labels, histogram):
+    for q in QUANTILES:
+        lines.append('{}{{{},quantile="{}"}} {:.9f}'.format(name, labels, q, histogram.percentile(q) / 1e9))
+    lines.append('{}_sum{{{}}} {:.9f}'.format(name, labels, histogram.total / 1e9))
+    lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+
+
+def render(sessions):
+    """
+    :param: the sessions.Session objects to report on
+    :return: the metrics in the Prometheus text exposition format
+    """
+    lines = [
+        '# HELP process_cpu_seconds_total CPU time used by the server process.',
+        '# TYPE process_cpu_seconds_total counter',
+        'process_cpu_seconds_total {:.6f}'.format(time.process_time()),
+    ]
+    counters = [
+        ('stadia_frames_in_total', 'Frames received from the client.', lambda s: s.metrics.frames_in),
+        ('stadia_datagrams_dropped_total', 'Late or duplicate UDP frames dropped.', lambda s: s.metrics.datagrams_dropped),
+        ('stadia_reports_submitted_total', 'Reports sent to the driver.', lambda s: s.output.submitted),
+        ('stadia_reports_skipped_total', 'Reports not sent because they did not change.', lambda s: s.output.skipped),
+    ]
+    for name, help, value in counters:
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} counter'.format(name))
+        for session in sessions:
+            lines.append('{}{{slot="{}"}} {}'.format(name, session.slot, value(session)))
+    lines.append('# HELP stadia_client_poll_rate_hz Gamepad polling rate achieved by the client, as last reported.')
+    lines.append('# TYPE stadia_client_poll_rate_hz gauge')
+    for session in sessions:
+        if session.metrics.poll_rate is not None:
+            lines.append('stadia_client_poll_rate_hz{{slot="{}"}} {:.1f}'.format(session.slot, session.metrics.poll_rate))
+    lines.append('# HELP stadia_stage_seconds Time spent in each stage of the input path.')
+    lines.append('# TYPE stadia_stage_seconds summary')
+    for session in sessions:
+        stages = (
+            ('decode', session.metrics.decode),
+            ('translate', session.metrics.translate),
+            # added by the jitter buffer, see jitter.py
+            ('jitter', session.metrics.jitter),
+            ('submit', session.output.submit_time),
+            # from the frame's arrival to its report reaching the driver, includes waiting for the tick
+            ('total', session.output.latency),
+        )
+        for stage, histogram in stages:
+            _summary(lines, 'stadia_stage_seconds', 'slot="{}",stage="{}"'.format(session.slot, stage), histogram)
+    lines.append('# HELP stadia_startup_seconds Time from launch until each startup step was reached.')
+    lines.append('# TYPE stadia_startup_seconds gauge')
+    for step, seconds in startup.timeline():
+        lines.append('stadia_startup_seconds{{step="{}"}} {:.6f}'.format(step, seconds))
+    return '\n'.join(lines) + '\n'
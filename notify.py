@@ -0,0 +1,107 @@
+"""
+Thread-safe, coalescing hand-off of notifications to an event loop
+"""
+
+import asyncio
+import threading
+
+
+class Mailbox:
+    """
+    Bounded, latest-value-wins queue from any thread to the event loop of a session's connection
+
+    The driver calls feedback callbacks on its own thread, sometimes every few
+    milliseconds. put() never blocks it: a value replaces any pending value of the same
+    kind, values identical to the last one delivered are not queued again, and the
+    loop is only woken once per batch. A slow or absent reader makes updates coalesce
+    or drop instead of building up a backlog.
+    """
+
+    def __init__(self, maxsize=4):
+        """
+        :param: maximum number of distinct kinds of pending values
+        """
+        self.maxsize = maxsize
+        self.coalesced = 0  # replaced by a newer value before delivery, or identical to the last one delivered
+        self.dropped = 0  # put while no reader was attached, or evicted because the mailbox was full
+        self._pending = {}
+        self._delivered = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._event = None
+        self._signalled = False
+
+    def attach(self, loop):
+        """
+        Makes the mailbox deliver to a reader on `loop`, replacing any previous reader
+        Must be called from that loop.
+
+        :return: the reader handle to pass to get()
+        """
+        with self._lock:
+            self._loop = loop
+            self._event = asyncio.Event()
+            self._signalled = False
+            # the new client has not seen any state yet
+            self._delivered.clear()
+            return self._event
+
+    def detach(self):
+        """
+        Stops delivery, values put until the next attach() are dropped
+        """
+        with self._lock:
+            loop, event = self._loop, self._event
+            self._loop = None
+            self._event = None
+            self._pending.clear()
+        if loop is not None:
+            # let the old reader notice
+            loop.call_soon_threadsafe(event.set)
+
+    def put(self, kind, value):
+        """
+        Queues a value, from any thread
+
+        :param kind: what the value is about (e.g. 'feedback'), a newer value replaces a pending one of the same kind
+        :param value: the value, compared with == to the last one delivered
+        """
+        with self._lock:
+            if self._loop is None:
+                self.dropped += 1
+                return
+            if kind in self._pending:
+                self.coalesced += 1
+            elif self._delivered.get(kind) == value:
+                self.coalesced += 1
+                return
+            elif len(self._pending) >= self.maxsize:
+                del self._pending[next(iter(self._pending))]
+                self.dropped += 1
+            self._pending[kind] = value
+            if self._signalled:
+                return
+            self._signalled = True
+            loop, event = self._loop, self._event
+        loop.call_soon_threadsafe(event.set)
+
+    async def get(self, reader):
+        """
+        Waits for pending values
+
+        :param: the handle returned by attach()
+        :return: a list of (kind, value), or None once the reader was detached or replaced
+        """
+        while True:
+            with self._lock:
+                if reader is not self._event:
+                    return None
+                if self._pending:
+                    batch = list(self._pending.items())
+                    self._pending.clear()
+                    self._delivered.update(batch)
+                    self._signalled = False
+                    return batch
+                self._signalled = False
+                reader.clear()
+            await reader.wait()
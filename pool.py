@@ -0,0 +1,111 @@
+"""
+Pool of pre-attached virtual devices
+"""
+
+import threading
+from collections import deque
+
+from vgamepad.win.vigem_commons import VIGEM_TARGET_TYPE
+
+
+class DevicePool:
+    """
+    Keeps virtual devices plugged in between sessions
+
+    Plugging a device in (vigem_target_add) blocks until Windows has enumerated it, and
+    games see every removal as an unplug. Sessions lease a device from the pool instead
+    and hand it back, neutral but still attached, when they end.
+    """
+
+    def __init__(self, backend, size=1):
+        """
+        :param backend: the backends.Backend devices are created on
+        :param size: number of idle devices kept attached per target type
+        """
+        self.backend = backend
+        self.size = size
+        self._free = {}
+        # devices being created by fill(), by target type
+        self._creating = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def fill(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired, background=False):
+        """
+        Attaches devices until `size` of them are idle
+
+        :param target_type: the VIGEM_TARGET_TYPE to create
+        :param background: True to run in a daemon thread and return it instead of blocking
+        """
+        if background:
+            thread = threading.Thread(target=self.fill, args=(target_type,), name='device-pool', daemon=True)
+            thread.start()
+            return thread
+        self.backend.warmup()
+        while True:
+            with self._lock:
+                # counting the devices another fill() is creating, so that concurrent ones do not overfill
+                if self._available(target_type) >= self.size:
+                    return
+                self._creating[target_type] = self._creating.get(target_type, 0) + 1
+            try:
+                device = self.backend.create_device(target_type)
+            finally:
+                with self._lock:
+                    self._creating[target_type] -= 1
+            with self._lock:
+                self._free[target_type].append(device)
+
+    def _available(self, target_type):
+        return len(self._free.setdefault(target_type, deque())) + self._creating.get(target_type, 0)
+
+    def acquire(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        """
+        Leases an idle device, creating one only if none is available, then attaches a
+        replacement in the background so that the next session does not wait for one either
+
+        :param: the VIGEM_TARGET_TYPE wanted
+        :return: the device
+        """
+        with self._lock:
+            free = self._free.get(target_type)
+            device = free.popleft() if free else None
+            if device is not None:
+                self._leases[device] = target_type
+        if device is None:
+            device = self.backend.create_device(target_type)
+            with self._lock:
+                self._leases[device] = target_type
+        if self.size:
+            self.fill(target_type, background=True)
+        return device
+
+    def release(self, device):
+        """
+        Returns a leased device: its feedback callback is removed and a neutral report
+        is submitted. It stays attached unless `size` devices of its type are already idle.
+
+        :param: a device obtained from acquire()
+        """
+        device.unregister_notification()
+        device.reset()
+        device.update()
+        with self._lock:
+            target_type = self._leases.pop(device)
+            if self._available(target_type) < self.size:
+                self._free[target_type].append(device)
+        # otherwise the last reference goes away with the caller's and the device is unplugged
+
+    def idle(self, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        """
+        :return: the number of idle devices of that type
+        """
+        with self._lock:
+            return len(self._free.get(target_type, ()))
+
+    def leased(self):
+        """
+        :return: the number of devices currently leased
+        """
+        with self._lock:
+            return len(self._leases)
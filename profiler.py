@@ -0,0 +1,88 @@
+"""
+Sampling profiler for the live server
+
+Samples the stacks of the event loop and output scheduler threads a few hundred
+times per second from a thread of its own, so the server runs at full speed and no
+debug build is needed. Stacks are written in the collapsed format (one
+"thread;outer;...;inner count" line per stack) read by flamegraph.pl and speedscope,
+to a file next to the executable.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# next to StadiaWireless.exe when frozen, next to the code otherwise
+OUTPUT_DIR = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+
+# Threads sampled, by name prefix: the event loop (which handles every socket) and the output schedulers
+THREADS = ('MainThread', 'output-scheduler')
+
+
+class Profiler:
+    def __init__(self, interval=0.005, threads=THREADS, directory=OUTPUT_DIR):
+        """
+        :param interval: seconds between samples
+        :param threads: name prefixes of the threads to sample
+        :param directory: where profiles are written
+        """
+        self.interval = interval
+        self.threads = threads
+        self.directory = directory
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds):
+        """
+        Samples for `seconds` in the background, then writes the profile to self.path
+
+        :return: False if a profile is already being taken
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self.path = os.path.join(self.directory, 'profile-{}.folded'.format(time.strftime('%Y%m%d-%H%M%S')))
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds, self.path), name='profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """
+        Ends the current profile early and waits for it to be written
+
+        :return: the path of the profile, None if none was taken
+        """
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.path
+
+    def _run(self, seconds, path):
+        counts = {}
+        deadline = time.perf_counter() + seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident)
+                if name is None or not name.startswith(self.threads):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+                    frame = frame.f_back
+                stack.append(name)
+                key = ';'.join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+        with open(path, 'w') as f:
+            for stack, count in sorted(counts.items()):
+                f.write('{} {}\n'.format(stack, count))
@@ -0,0 +1,130 @@
+"""
+Wire protocol for the /controller websocket
+
+Clients open the socket, send a JSON hello listing the binary protocol versions
+they speak and, if the server answers with a welcome naming one of them, switch
+to fixed-size binary frames. Clients that never receive a welcome keep sending
+the legacy JSON objects, which decode to the same Frame.
+
+Hello fields: "protocol" (list of versions), "resume" (token from a previous
+welcome), "ack" (true to receive {"type": "ack", "seq": n} when the report of
+frame n reaches the driver), "profile" (the name of a curves profile) and
+"jitter" (true to smooth bursty input with a jitter buffer, see jitter.py; the
+welcome then says "jitter": true).
+Clients may also send {"type": "stats", "pollRate": hz} with the rate at which
+they manage to poll the gamepad.
+"""
+
+import json
+import math
+import struct
+from collections import namedtuple
+
+PROTOCOL_VERSION = 1
+SUPPORTED_VERSIONS = (PROTOCOL_VERSION,)
+
+# Number of buttons reported by the browser Gamepad API for a standard mapping
+# (Stadia adds Assistant and Capture as 17 and 18)
+BUTTON_COUNT = 19
+
+# version, flags, seq, timestamp (us), buttons, lt, rt, lx, ly, rx, ry
+FRAME_STRUCT = struct.Struct('<BBHIIBBhhhh')
+FRAME_SIZE = FRAME_STRUCT.size
+
+# Frame flags; a keepalive repeats the last state while nothing changes and is handled like any other frame
+FLAG_KEEPALIVE = 0x01
+
+# Axes are browser-oriented (+y is down) and scaled to int16, triggers to a byte
+Frame = namedtuple('Frame', 'flags seq timestamp buttons lt rt lx ly rx ry')
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def decode_frame(data):
+    """
+    Decodes a binary frame
+
+    :param: a bytes-like object of FRAME_SIZE bytes
+    :return: a Frame
+    """
+    if len(data) != FRAME_SIZE:
+        raise ProtocolError("Expected a {} byte frame, got {}".format(FRAME_SIZE, len(data)))
+    version, flags, seq, timestamp, buttons, lt, rt, lx, ly, rx, ry = FRAME_STRUCT.unpack(data)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError("Unsupported frame version {}".format(version))
+    return Frame(flags, seq, timestamp, buttons, lt, rt, lx, ly, rx, ry)
+
+
+def encode_frame(frame):
+    """
+    Encodes a Frame (used by native and synthetic clients)
+
+    :param: a Frame
+    :return: FRAME_SIZE bytes
+    """
+    return FRAME_STRUCT.pack(PROTOCOL_VERSION, *frame)
+
+
+def _unit(value, low):
+    # clamped to [low, 1]; inf and nan (which Python's json accepts) have no sensible place in it
+    if not math.isfinite(value):
+        raise ProtocolError("Expected a finite number, got {!r}".format(value))
+    return max(low, min(1.0, value))
+
+
+def _axis(value):
+    return int(_unit(value, -1.0) * 32767)
+
+
+def _trigger(value):
+    return int(_unit(value, 0.0) * 255)
+
+
+def frame_from_message(message):
+    """
+    Converts a legacy JSON message (as sent by older clients) to a Frame
+
+    :param: the decoded JSON object
+    :return: a Frame
+    :raises ProtocolError: if a stick or trigger value is not a finite number
+    """
+    buttons = 0
+    for index in range(BUTTON_COUNT):
+        # triggers ('6' and '7') carry their analog value, anything non-zero counts as pressed
+        if message.get(str(index)):
+            buttons |= 1 << index
+    return Frame(0, 0, 0, buttons,
+                 _trigger(message.get('6', 0)),
+                 _trigger(message.get('7', 0)),
+                 _axis(message['lx']), _axis(message['ly']),
+                 _axis(message['rx']), _axis(message['ry']))
+
+
+def is_control(message):
+    """
+    :return: True if the decoded JSON object is a control message rather than a legacy frame
+    """
+    return 'type' in message
+
+
+def negotiate(hello):
+    """
+    Picks the highest binary protocol version offered in a hello message
+
+    :param: the decoded hello object, e.g. {"type": "hello", "protocol": [1]}
+    :return: the version to use, or None to stay on JSON
+    """
+    offered = hello.get('protocol') or ()
+    common = [version for version in offered if version in SUPPORTED_VERSIONS]
+    return max(common) if common else None
+
+
+def welcome(version, **extra):
+    """
+    :return: the JSON welcome message answering a hello
+    """
+    message = {'type': 'welcome', 'protocol': version}
+    message.update(extra)
+    return json.dumps(message)
@@ -0,0 +1,195 @@
+"""
+Report recording and replay
+
+A recording is an append-only file: a fixed header followed by fixed-size records of
+(time.perf_counter_ns() when the report reached the driver, raw report bytes). Fixed
+sizes keep writing to a single buffered write per report and let a reader memory-map
+the file and index it directly; a record cut short by a crash is ignored.
+
+Replaying re-submits the reports to any backend's device with the original spacing,
+which reproduces a session's input without a phone, and runs the exact same workload
+against different backends.
+
+Usage: python recording.py info FILE
+       python recording.py replay FILE [--backend loopback] [--speed 1.0]
+"""
+
+import argparse
+import ctypes
+import json
+import mmap
+import struct
+import time
+
+import backends
+import metrics
+from vgamepad.win.vigem_commons import VIGEM_TARGET_TYPE, XUSB_REPORT, DS4_REPORT
+
+MAGIC = b'SWRC'
+VERSION = 1
+# magic, version, target type, report size, reserved
+HEADER_STRUCT = struct.Struct('<4sBBH8x')
+TIMESTAMP_STRUCT = struct.Struct('<Q')
+
+REPORT_TYPES = {
+    VIGEM_TARGET_TYPE.Xbox360Wired: XUSB_REPORT,
+    VIGEM_TARGET_TYPE.DualShock4Wired: DS4_REPORT,
+}
+
+# the last stretch of each wait is spun: time.sleep() can overshoot by a scheduler quantum
+SPIN = 0.002
+
+
+class RecordingError(ValueError):
+    pass
+
+
+class Recorder:
+    """
+    Appends the reports of one device to a recording
+    """
+
+    def __init__(self, path, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+        """
+        :param path: the file, created or appended to
+        :param target_type: the VIGEM_TARGET_TYPE of the recorded device
+        """
+        self.target_type = target_type
+        self.report_size = ctypes.sizeof(REPORT_TYPES[target_type])
+        self.count = 0
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER_STRUCT.pack(MAGIC, VERSION, target_type, self.report_size))
+            self._file.flush()
+        else:
+            with open(path, 'rb') as f:
+                _check_header(f.read(HEADER_STRUCT.size), target_type, self.report_size)
+
+    def record(self, timestamp, data):
+        """
+        Appends a record
+
+        :param timestamp: time.perf_counter_ns() of the submission
+        :param data: the report's bytes
+        """
+        self._file.write(TIMESTAMP_STRUCT.pack(timestamp) + data)
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _check_header(header, target_type=None, report_size=None):
+    if len(header) < HEADER_STRUCT.size:
+        raise RecordingError("Truncated header")
+    magic, version, recorded_type, recorded_size = HEADER_STRUCT.unpack(header)
+    if magic != MAGIC:
+        raise RecordingError("Not a recording")
+    if version != VERSION:
+        raise RecordingError("Unsupported recording version {}".format(version))
+    if target_type is not None and (recorded_type, recorded_size) != (target_type, report_size):
+        raise RecordingError("The recording is of another kind of device")
+    return VIGEM_TARGET_TYPE(recorded_type), recorded_size
+
+
+class Recording:
+    """
+    Read-only, memory-mapped view of a recording, a sequence of (timestamp in ns, report bytes)
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.target_type, self.report_size = _check_header(self._map[:HEADER_STRUCT.size])
+        self.report_type = REPORT_TYPES[self.target_type]
+        self.record_size = TIMESTAMP_STRUCT.size + self.report_size
+        self._count = (len(self._map) - HEADER_STRUCT.size) // self.record_size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        offset = HEADER_STRUCT.size + index * self.record_size
+        timestamp, = TIMESTAMP_STRUCT.unpack_from(self._map, offset)
+        return timestamp, self._map[offset + TIMESTAMP_STRUCT.size:offset + self.record_size]
+
+    def duration(self):
+        """
+        :return: seconds between the first and last records
+        """
+        return (self[-1][0] - self[0][0]) / 1e9 if self._count else 0.0
+
+    def close(self):
+        self._map.close()
+
+
+def replay(recording, device, speed=1.0, spin=SPIN):
+    """
+    Submits the reports of a recording to a device with their recorded spacing
+
+    :param recording: a Recording
+    :param device: a device of the recording's target type (see backends)
+    :param speed: playback speed, 2 replays twice as fast
+    :param spin: seconds before each deadline spent busy-waiting instead of sleeping
+    :return: metrics.Histograms of how late each report was, and of the duration of update(), in ns
+    """
+    lateness = metrics.Histogram()
+    submit_time = metrics.Histogram()
+    if not len(recording):
+        return lateness, submit_time
+    first = recording[0][0]
+    start = time.perf_counter_ns()
+    spin_ns = int(spin * 1e9)
+    for timestamp, data in recording:
+        deadline = start + int((timestamp - first) / speed)
+        remaining = deadline - time.perf_counter_ns()
+        if remaining > spin_ns:
+            time.sleep((remaining - spin_ns) / 1e9)
+        now = time.perf_counter_ns()
+        while now < deadline:
+            now = time.perf_counter_ns()
+        device.update_from_buffer(data)
+        end = time.perf_counter_ns()
+        lateness.record(now - deadline)
+        submit_time.record(end - now)
+    return lateness, submit_time
+
+
+def _summary(histogram):
+    return {q: histogram.percentile(q) / 1e3 for q in metrics.QUANTILES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay a report recording")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info')
+    info.add_argument('file')
+    play = commands.add_parser('replay')
+    play.add_argument('file')
+    play.add_argument('--backend', default='loopback', choices=sorted(backends.BACKENDS))
+    play.add_argument('--speed', type=float, default=1.0)
+    args = parser.parse_args()
+
+    recording = Recording(args.file)
+    result = {
+        'target_type': recording.target_type.name,
+        'records': len(recording),
+        'seconds': round(recording.duration(), 3),
+    }
+    if args.command == 'replay':
+        device = backends.create_backend(args.backend).create_device(recording.target_type)
+        lateness, submit_time = replay(recording, device, args.speed)
+        result['late_us'] = _summary(lateness)
+        result['update_us'] = _summary(submit_time)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Fixed-rate, change-detecting report submission
+"""
+
+import threading
+import time
+
+import metrics
+from vgamepad.win.vigem_commons import VIGEM_TARGET_TYPE
+
+# Bytes of each kind of report holding the buttons: wButtons, and bSpecial for a DS4_REPORT
+BUTTON_BYTES = {
+    VIGEM_TARGET_TYPE.Xbox360Wired: slice(0, 2),
+    VIGEM_TARGET_TYPE.DualShock4Wired: slice(4, 7),
+}
+
+
+class OutputScheduler:
+    """
+    Pushes the latest report of a device to the driver at a fixed rate
+
+    Reports identical to the one last sent are skipped, so a controller at rest costs
+    no driver calls, and the rate seen by games no longer depends on the phone's frame
+    timing. Button edges can bypass the tick so presses are never delayed.
+    """
+
+    def __init__(self, gamepad, rate=250, push_on_edge=True, name='output-scheduler', recorder=None):
+        """
+        :param gamepad: the device, anything with a report attribute, get_type() and update_from_buffer()
+        :param rate: ticks per second, 0 to push every changed report immediately
+        :param push_on_edge: push immediately when the buttons change
+        :param recorder: a recording.Recorder every report sent is appended to, closed with the scheduler
+        """
+        self.gamepad = gamepad
+        self.rate = rate
+        self.push_on_edge = push_on_edge
+        self.recorder = recorder
+        self.submitted = 0
+        self.skipped = 0
+        # duration of the driver call, and time from a report's arrival to its submission
+        self.submit_time = metrics.Histogram()
+        self.latency = metrics.Histogram()
+        self._lock = threading.Lock()
+        self._pending = None
+        self._received = None
+        self._seq = None
+        # called with the sequence number of each report sent to the driver, from the thread that sent it
+        self.on_submit = None
+        # called on each tick, under the scheduler's lock, with time.perf_counter_ns(); returns the
+        # (report, received, seq) to send or None, see jitter.JitterBuffer.sample
+        self.sample = None
+        self._last = bytes(gamepad.report)
+        self._buttons = BUTTON_BYTES[gamepad.get_type()]
+        self._running = True
+        self._thread = None
+        if rate:
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def submit(self, report, received=None, seq=None):
+        """
+        Queues a report for the next tick
+
+        :param report: the bytes of an XUSB_REPORT or DS4_REPORT (or the structure itself)
+        :param received: time.perf_counter_ns() when the frame it comes from arrived, for latency statistics
+        :param seq: the frame's sequence number, passed to on_submit
+        """
+        report = bytes(report)
+        with self._lock:
+            self._pending = report
+            self._received = received
+            self._seq = seq
+            if not self._thread or (self.push_on_edge and self._is_edge(report)):
+                self._flush()
+
+    def flush(self):
+        """
+        Pushes the pending report now, if it changed
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """
+        Sends any pending report and stops the scheduler
+        """
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def _is_edge(self, report):
+        return report[self._buttons] != self._last[self._buttons]
+
+    def _flush(self):
+        report = self._pending
+        if report is None:
+            return
+        self._pending = None
+        if report == self._last:
+            self.skipped += 1
+            return
+        start = time.perf_counter_ns()
+        self.gamepad.update_from_buffer(report)
+        end = time.perf_counter_ns()
+        self.submit_time.record(end - start)
+        if self.recorder is not None:
+            self.recorder.record(end, report)
+        if self._received is not None:
+            self.latency.record(end - self._received)
+        self._last = report
+        self.submitted += 1
+        if self.on_submit is not None and self._seq is not None:
+            self.on_submit(self._seq)
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        deadline = time.perf_counter()
+        while self._running:
+            deadline += interval
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind (e.g. a slow driver call), skip the missed ticks instead of bursting
+                deadline = time.perf_counter()
+            with self._lock:
+                if self.sample is not None:
+                    sampled = self.sample(time.perf_counter_ns())
+                    if sampled is not None:
+                        self._pending, self._received, self._seq = sampled
+                self._flush()
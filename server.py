@@ -1,223 +1,167 @@
-from flask import Flask, render_template, request
-from flask_sock import Sock
+# first, so the startup timeline counts from here
+import startup
+import os
 import socket
-import vgamepad as vg
-import json
-from pystray import Icon as icon, Menu as menu, MenuItem as item
-from PIL import Image
 import threading
-import ctypes
-import datetime
-
-app = Flask(__name__, static_url_path='',
-            static_folder='static',
-            template_folder='templates')
-sock = Sock(app)
-# gamepad = None
-
-
-def create_image():
-    # Open logo.png
-    image = Image.open("logo.png")
-    # Resize the image heigh 64 and preserve the aspect ratio
-    image.thumbnail((64, 64), Image.ANTIALIAS)
-    return image
-
-
-@sock.route('/controller')
-def controller(ws):
-    def my_callback(client, target, large_motor, small_motor, led_number, user_data):
-        notif = {
-            'lm': large_motor,
-            'sm': small_motor,
-            'led': led_number,
-        }
-        ws.send(json.dumps(notif))
-    # global gamepad
-    gamepad = None
-    if gamepad == None:
-        gamepad = vg.VX360Gamepad()
-    gamepad.register_notification(callback_function=my_callback)
-    while True:
-        if not ws.connected:
-            print("Disconnected")
-            gamepad.unregister_notification()
-            del gamepad
-            gamepad = None
-            ws.close()
-            return
-        message = ws.receive(0.1)
-        if message and message.startswith('{'):
-            message = json.loads(message)
-            gamepad.left_joystick(
-                int(message['lx']*32767), -int(message['ly']*32767))
-            gamepad.right_joystick(
-                int(message['rx']*32767), -int(message['ry']*32767))
-            if message['0'] == True:
-                gamepad.press_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            elif message['0'] == False:
-                gamepad.release_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            if message['1'] == True:
-                gamepad.press_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_B)
-            elif message['1'] == False:
-                gamepad.release_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_B)
-            if message['2'] == True:
-                gamepad.press_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_X)
-            elif message['2'] == False:
-                gamepad.release_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_X)
-            if message['3'] == True:
-                gamepad.press_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_Y)
-            elif message['3'] == False:
-                gamepad.release_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_Y)
-            if message['4'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER)
-            elif message['4'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER)
-            if message['5'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER)
-            elif message['5'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER)
-            gamepad.left_trigger(int(message['6']*255))
-            gamepad.right_trigger(int(message['7']*255))
-            if message['8'] == True:
-                gamepad.press_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_BACK)
-            elif message['8'] == False:
-                gamepad.release_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_BACK)
-            if message['9'] == True:
-                gamepad.press_button(button=vg.XUSB_BUTTON.XUSB_GAMEPAD_START)
-            elif message['9'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_START)
-            if message['10'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB)
-            elif message['10'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB)
-            if message['11'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB)
-            elif message['11'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB)
-            if message['12'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP)
-            elif message['12'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP)
-            if message['13'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN)
-            elif message['13'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN)
-            if message['14'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT)
-            elif message['14'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT)
-            if message['15'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT)
-            elif message['15'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT)
-            if message['16'] == True:
-                gamepad.press_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_GUIDE)
-            elif message['16'] == False:
-                gamepad.release_button(
-                    button=vg.XUSB_BUTTON.XUSB_GAMEPAD_GUIDE)
-            gamepad.update()
-        elif message and message == 'disconnect':
-            print("Disconnected")
-            gamepad.unregister_notification()
-            del gamepad
-            gamepad = None
-            ws.close()
-            return
-
-
-@app.route('/')
-def index():
-    return render_template('index.html')
+import config
 
+# The rest (asyncio, websockets, the driver bindings...) is imported once the listening socket is bound:
+# a phone that connects meanwhile waits in its backlog instead of being refused
 
 hostname = socket.gethostname()
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.bind(('0.0.0.0', 0))
-port = sock.getsockname()[1]
-sock.close()
-
-
-def runServer():
-    print("Open this webpage in your mobile: http://"+hostname+':'+str(port))
-    app.run(host='0.0.0.0', port=port)
-
-
-class thread_with_exception(threading.Thread):
-    def __init__(self, name):
-        threading.Thread.__init__(self)
-        self.name = name
-
-    def run(self):
 
-        # target function of the thread class
-        try:
-            runServer()
-        finally:
-            print('ended')
-
-    def get_id(self):
-
-        # returns id of the respective thread
-        if hasattr(self, '_thread_id'):
-            return self._thread_id
-        for id, thread in threading._active.items():
-            if thread is self:
-                return id
-
-    def raise_exception(self):
-        thread_id = self.get_id()
-        res = ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id,
-                                                         ctypes.py_object(SystemExit))
-        if res > 1:
-            ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, 0)
-            print('Exception raise failure')
-
-
-t = thread_with_exception('thread_with_exception')
-t.start()
-
-
-def exit(icon):
-    global t
-    t.raise_exception()
-    t.join()
-    icon.visible = False
-    icon.stop()
+# Pixels per side of the tray icon, which Windows shows at 16 to 32 (64 on high DPI screens)
+TRAY_SIZE = 64
+
+
+def trayImage():
+    """
+    :return: the tray icon's image, from a 64 px copy of logo.ico cached on first launch
+             (decoding and scaling the whole icon every time is the slow part)
+    """
+    from PIL import Image
+    import engine
+
+    logo = os.path.join(engine.ROOT, 'logo.ico')
+    # named after the size of logo.ico, so a new logo is picked up
+    cached = os.path.join(config.CACHE_DIR, 'tray-{}-{}.png'.format(TRAY_SIZE, os.path.getsize(logo)))
+    try:
+        return Image.open(cached)
+    except OSError:
+        pass
+    image = Image.open(logo)
+    if hasattr(image, 'ico'):
+        # the icon's own 64 px frame if it has one, without decoding the others
+        image = image.ico.getimage((TRAY_SIZE, TRAY_SIZE))
+    image = image.convert('RGBA')
+    if image.size != (TRAY_SIZE, TRAY_SIZE):
+        image = image.resize((TRAY_SIZE, TRAY_SIZE), Image.LANCZOS)
+    try:
+        os.makedirs(config.CACHE_DIR, exist_ok=True)
+        image.save(cached)
+    except OSError:
+        pass  # read-only profile, decoded again next time
+    return image
 
 
-def startIcon():
+def startIcon(port, stop, sampler):
+    # pystray gets its own thread so the event loop never waits on the tray
     import webbrowser
-    icon('test', Image.open('logo.ico'), menu=menu(
+    from pystray import Icon as icon, Menu as menu, MenuItem as item
+
+    def profile(icon):
+        if sampler.running:
+            print("Profile written to " + sampler.stop())
+        else:
+            sampler.start(30)
+            print("Profiling for 30 seconds, writing to " + sampler.path)
+
+    def exit(icon):
+        stop()
+        icon.visible = False
+        icon.stop()
+
+    # in multi-worker mode there is no single server to profile
+    profiling = () if sampler is None else (
+        item(
+            lambda item: 'Stop profiling' if sampler.running else 'Profile for 30 seconds',
+            action=profile
+        ),
+    )
+    tray = icon('test', trayImage(), menu=menu(
         item(
             'http://'+hostname+':'+str(port),
             action=lambda: webbrowser.open('http://'+hostname+':'+str(port))
         ),
         item('http://'+socket.gethostbyname(socket.gethostname())+':'+str(port),
              action=lambda: webbrowser.open('http://'+socket.gethostbyname(socket.gethostname())+':'+str(port))),
+        *profiling,
         item(
             'Exit',
             action=exit
         )
-    )).run()
+    ))
+    startup.mark('tray icon')
+    tray.run()
 
 
-startIcon()
+def announce(port, stop, sampler=None):
+    """
+    Prints the address to open and starts the tray icon, once the server accepts connections
+    """
+    print("Open this webpage in your mobile: http://"+hostname+':'+str(port))
+    if config.TRAY:
+        threading.Thread(target=startIcon, args=(port, stop, sampler), name='tray', daemon=True).start()
+
+
+async def run(server, listener):
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def ready(port):
+        startup.mark('serving')
+        announce(port, lambda: loop.call_soon_threadsafe(stop.set), server.profiler)
+
+    await server.serve(config.HOST, None, stop, ready, config.UDP_PORT, listener)
+
+
+def create_engine(shared_slots=None):
+    """
+    :param shared_slots: the workers.SharedSlots of a worker process, None otherwise
+    :return: the engine.Engine, and the driver_process.DriverProcess to close when it is done (or None)
+    """
+    import backends
+    import engine
+    import pool
+    import profiler
+    import sessions
+    import translation
+
+    startup.mark('imported')
+    driver = None
+    outputs = None
+    if config.DRIVER_PROCESS:
+        import driver_process
+        driver = driver_process.DriverProcess(config.BACKEND, config.POOL_SIZE, config.MAX_PLAYERS,
+                                              config.OUTPUT_RATE, config.PUSH_ON_EDGE)
+        devices, outputs = driver, driver.create_output
+    else:
+        backend = backends.create_backend(config.BACKEND)
+        devices = pool.DevicePool(backend, config.POOL_SIZE)
+
+        def fill():
+            devices.fill()
+            startup.mark('driver ready')
+        # connect to the driver and attach the idle devices while the web server and tray icon come up
+        threading.Thread(target=fill, name='device-pool', daemon=True).start()
+    players = sessions.SessionManager(devices, config.MAX_PLAYERS, config.RESUME_GRACE,
+                                      config.OUTPUT_RATE, config.PUSH_ON_EDGE, config.RECORD_DIR, outputs,
+                                      shared_slots)
+    server = engine.Engine(players, lambda profile=config.PROFILE: translation.create_translator(profile=profile),
+                           profiler.Profiler())
+    return server, driver
+
+
+def main(port=config.PORT):
+    if config.WORKERS > 1:
+        import workers
+        workers.main(port, config.WORKERS, announce)
+        return
+    listener = socket.create_server((config.HOST, port), backlog=socket.SOMAXCONN)
+    startup.mark('listening')
+    server, driver = create_engine()
+    try:
+        import asyncio
+        asyncio.run(run(server, listener))
+    finally:
+        if driver is not None:
+            driver.close()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    # the driver process starts this executable again when frozen
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,255 @@
+"""
+Player sessions
+
+A session owns a leased virtual device, its output scheduler and its feedback
+subscription. It outlives the websocket: when a phone drops off the network the
+session is kept for a grace period, and a client that reconnects with the session's
+resume token gets the same device back without it being re-enumerated.
+"""
+
+import os
+import secrets
+import threading
+import time
+
+import jitter
+import metrics
+import notify
+import recording
+import scheduler
+import udp
+
+
+class SlotsFull(Exception):
+    """
+    Raised when every player slot is taken, or the driver has no room for another device
+    """
+    pass
+
+
+class Session:
+    def __init__(self, slot, token, device, output):
+        self.slot = slot
+        self.token = token
+        # authenticates the session's UDP datagrams, see udp.py
+        self.udp_key = secrets.token_bytes(udp.KEY_SIZE)
+        self.udp_address = None
+        self.udp_seq = 0
+        self.device = device
+        self.output = output
+        self.connection = None
+        self.expiry = None
+        # set by the engine, keeps the stick hysteresis state across reconnects
+        self.translator = None
+        # set by smooth()
+        self.jitter = None
+        self.metrics = metrics.SessionMetrics()
+        # drained by the connection's event loop, see engine.Engine.drain
+        self.mailbox = notify.Mailbox()
+        device.register_notification(callback_function=self.feedback)
+
+    def acknowledge(self, enabled):
+        """
+        Sends the client the sequence number of its frames as their reports reach the driver
+        (latest wins, like feedback), for clients measuring end-to-end latency
+        """
+        self.output.on_submit = (lambda seq: self.mailbox.put('ack', seq)) if enabled else None
+
+    def smooth(self, enabled):
+        """
+        Plays the client's frames out through a jitter.JitterBuffer on the ticks of the output
+        scheduler, which needs a local scheduler with a rate (not 0, not in the driver process)
+
+        :return: whether the session has a jitter buffer now
+        """
+        ticking = isinstance(self.output, scheduler.OutputScheduler) and self.output.rate
+        self.jitter = jitter.JitterBuffer(self.translator) if enabled and ticking else None
+        if ticking:
+            self.output.sample = self.jitter.sample if self.jitter is not None else None
+        return self.jitter is not None
+
+    def feedback(self, client, target, large_motor, small_motor, led_number, user_data):
+        """
+        Notification callback of the device, runs on the driver's thread
+        """
+        self.mailbox.put('feedback', {
+            'lm': large_motor,
+            'sm': small_motor,
+            'led': led_number,
+        })
+
+
+class SessionManager:
+    """
+    Assigns each connection a player slot with its own device
+    """
+
+    def __init__(self, devices, max_players=4, grace=10.0, rate=250, push_on_edge=True, record_dir=None,
+                 outputs=None, shared_slots=None):
+        """
+        :param devices: the pool.DevicePool devices are leased from
+        :param max_players: maximum number of concurrent sessions (and so devices)
+        :param grace: seconds a disconnected session is kept for its client to come back
+        :param rate: output rate of each session's scheduler.OutputScheduler
+        :param push_on_edge: see scheduler.OutputScheduler
+        :param record_dir: directory to record each session's reports to, None to not record
+        :param outputs: called with (device, slot, recording path or None) to start the output of a session,
+                        local_output() by default (see driver_process for the other one)
+        :param shared_slots: the workers.SharedSlots to claim slots from, None when this process is the only server
+        """
+        self.devices = devices
+        self.max_players = max_players
+        self.grace = grace
+        self.rate = rate
+        self.push_on_edge = push_on_edge
+        self.record_dir = record_dir
+        self.outputs = outputs or self.local_output
+        self.shared_slots = shared_slots
+        self._sessions = {}
+        self._slots = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def open(self, connection, token=None):
+        """
+        Resumes the session of a token if it is still alive, otherwise starts a new one
+
+        :param connection: identifies the client's connection
+        :param token: the resume token sent by the client, if any
+        :return: the Session
+        :raises SlotsFull: if no slot or device is available
+        """
+        with self._lock:
+            session = self._sessions.get(token) if token else None
+            if session is not None:
+                if session.expiry is not None:
+                    session.expiry.cancel()
+                    session.expiry = None
+                # a reconnect can beat the detection of the old socket's death, take over from it
+                session.connection = connection
+                return session
+            # disconnected sessions keep their slot until they expire
+            if self.shared_slots is not None:
+                slot = self.shared_slots.claim()
+            else:
+                slot = next((slot for slot in range(self.max_players) if slot not in self._slots), None)
+            if slot is None:
+                raise SlotsFull("All {} player slots are taken".format(self.max_players))
+            self._slots[slot] = None
+        record_path = None
+        if self.record_dir is not None:
+            record_path = os.path.join(self.record_dir,
+                                       'player{}-{}.rec'.format(slot + 1, time.strftime('%Y%m%d-%H%M%S')))
+        device = None
+        try:
+            device = self.devices.acquire()
+            output = self.outputs(device, slot, record_path)
+        except Exception as e:
+            if device is not None:
+                self.devices.release(device)
+            with self._lock:
+                del self._slots[slot]
+                if self.shared_slots is not None:
+                    self.shared_slots.free(slot)
+            if str(e) == 'VIGEM_ERROR_NO_FREE_SLOT':
+                raise SlotsFull("ViGEmBus has no free slot") from e
+            raise
+        session = Session(slot, secrets.token_urlsafe(16), device, output)
+        session.connection = connection
+        with self._lock:
+            self._sessions[session.token] = session
+            self._slots[slot] = session
+            self._keys[session.udp_key] = session
+        return session
+
+    def local_output(self, device, slot, record_path=None):
+        """
+        :return: a scheduler.OutputScheduler for the device of a session, recording to `record_path` if given
+        """
+        recorder = recording.Recorder(record_path, device.get_type()) if record_path else None
+        return scheduler.OutputScheduler(device, self.rate, self.push_on_edge, name='output-scheduler-{}'.format(slot),
+                                         recorder=recorder)
+
+    def find(self, udp_key):
+        """
+        :return: the session of a UDP key, None if there is none
+        """
+        return self._keys.get(udp_key)
+
+    def sessions(self):
+        """
+        :return: the open sessions, by slot
+        """
+        with self._lock:
+            return sorted((session for session in self._slots.values() if session is not None),
+                          key=lambda session: session.slot)
+
+    def slots(self):
+        """
+        :return: the slot map, {slot: {'connected': bool, 'submitted': reports sent, 'skipped': reports skipped, ...}}
+        """
+        sessions = self.sessions()
+        return {session.slot: {
+            'connected': session.connection is not None,
+            'submitted': session.output.submitted,
+            'skipped': session.output.skipped,
+            'feedback_coalesced': session.mailbox.coalesced,
+            'feedback_dropped': session.mailbox.dropped,
+            'poll_rate': session.metrics.poll_rate,
+        } for session in sessions}
+
+    def detach(self, session, connection):
+        """
+        Called when a client's connection drops, the session is closed if it is not resumed in time
+
+        :param session: the Session
+        :param connection: the connection that dropped
+        """
+        with self._lock:
+            if session.connection is not connection:
+                return  # already resumed on another connection
+            session.connection = None
+            session.mailbox.detach()
+            if self.grace <= 0:
+                expired = True
+            else:
+                expired = False
+                session.expiry = threading.Timer(self.grace, self._expire, args=(session,))
+                session.expiry.daemon = True
+                session.expiry.start()
+        if expired:
+            self.close(session)
+
+    def close(self, session):
+        """
+        Ends a session and returns its device to the pool
+        """
+        with self._lock:
+            if not self._forget(session):
+                return
+        self._end(session)
+
+    def _expire(self, session):
+        with self._lock:
+            # resumed while the timer was firing
+            if session.connection is not None or not self._forget(session):
+                return
+        self._end(session)
+
+    def _forget(self, session):
+        if self._sessions.pop(session.token, None) is None:
+            return False
+        del self._slots[session.slot]
+        del self._keys[session.udp_key]
+        if self.shared_slots is not None:
+            self.shared_slots.free(session.slot)
+        session.connection = None
+        session.mailbox.detach()
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        return True
+
+    def _end(self, session):
+        session.output.close()
+        self.devices.release(session.device)
@@ -0,0 +1,34 @@
+"""
+Startup timeline
+
+Records how long after launch the server reached each step of its cold start (the
+listening socket, the imports, the driver, the first request...), logs each one
+and serves them at /metrics, so that time-to-first-input can be tracked across
+releases. Times are counted from the import of this module, the first thing
+server.py does; the interpreter's own start (and unpacking a frozen executable)
+comes before that.
+"""
+
+import time
+
+STARTED = time.perf_counter()
+
+_steps = {}
+
+
+def mark(step):
+    """
+    Records that startup reached `step` now, only the first time it is reached
+    """
+    if step in _steps:
+        return
+    elapsed = time.perf_counter() - STARTED
+    _steps[step] = elapsed
+    print("Startup: {} after {:.1f} ms".format(step, elapsed * 1000))
+
+
+def timeline():
+    """
+    :return: [(step, seconds since launch)] in the order they were reached
+    """
+    return list(_steps.items())
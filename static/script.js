@@ -54,18 +54,76 @@ const buttonElems = {
 }
 
 
-let url = window.location.href.replace("http", "ws");
+// Only the host: the page's own path and query (?rate=, ?jitter=) must not end up in the socket's URL
+let url = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/controller';
+
+// Binary frame layout, see protocol.py
+const PROTOCOL_VERSION = 1;
+const FRAME_SIZE = 22;
+const FLAG_KEEPALIVE = 1;
+// Frames are only sent when the controller's state changes, and this often (ms) while it does not
+const KEEPALIVE_INTERVAL = 1000;
+// The on-screen controller is redrawn at most this often (ms)
+const DRAW_INTERVAL = 100;
+// How often the achieved polling rate is reported to the server (ms)
+const STATS_INTERVAL = 5000;
+const frameBuffer = new ArrayBuffer(FRAME_SIZE);
+const frameView = new DataView(frameBuffer);
+let frameSeq = 0;
+// 0 until the server answers our hello, in which case we keep sending JSON
+let protocol = 0;
+
+// Lets the server give us back the same virtual controller when we reconnect
+let resumeToken = sessionStorage.getItem('resumeToken');
+let reconnectDelay = 0;
+
+// Gamepad polling rate (Hz), from ?rate= (remembered for next time) or 250 by default.
+// 0 polls on animation frames, which browsers slow down or pause when the screen dims.
+const rateParameter = new URLSearchParams(window.location.search).get('rate');
+if (rateParameter !== null) {
+    localStorage.setItem('pollRate', rateParameter);
+}
+const POLL_RATE = Number(localStorage.getItem('pollRate') ?? 250) || 0;
+
+// ?jitter=1 (remembered) has the server smooth bursty Wi-Fi with a jitter buffer, for a few ms of delay
+const jitterParameter = new URLSearchParams(window.location.search).get('jitter');
+if (jitterParameter !== null) {
+    localStorage.setItem('jitter', jitterParameter);
+}
+const JITTER = localStorage.getItem('jitter') === '1';
 
 let gamepadIndex;
+let lastTimestamp;
+let lastSend = -Infinity;
+let lastDraw = -Infinity;
+let polls = 0;
+let lastStats = performance.now();
 let socket
 let connectSocket = () => {
-    socket = new WebSocket(url + '/controller');
+    protocol = 0;
+    socket = new WebSocket(url);
+    socket.binaryType = 'arraybuffer';
     socket.onopen = function (e) {
         console.log("[open] Connection established");
+        reconnectDelay = 0;
+        socket.send(JSON.stringify({ type: 'hello', protocol: [PROTOCOL_VERSION], resume: resumeToken, jitter: JITTER }));
     };
     socket.onmessage = function (event) {
         console.log(`[message] Data received from server: ${event.data}`);
         let data = JSON.parse(event.data);
+        if (data.type === 'welcome') {
+            protocol = data.protocol || 0;
+            resumeToken = data.token;
+            sessionStorage.setItem('resumeToken', resumeToken);
+            console.log(`[welcome] Player ${data.slot + 1}`);
+            // a resumed controller may have missed changes while we were away
+            lastSend = -Infinity;
+            return;
+        }
+        if (data.type === 'error') {
+            console.log(`[error] ${data.error}`);
+            return;
+        }
         console.log(data.lm);
         console.log(data.sm);
         // vibrate controller
@@ -80,11 +138,15 @@ let connectSocket = () => {
 
     socket.onclose = function (event) {
         connected = false;
+        protocol = 0;
         if (event.wasClean) {
             console.log(`[close] Connection closed cleanly, code=${event.code} reason=${event.reason}`);
         } else {
             console.log('[close] Connection died');
         }
+        // retry quickly first, the server only keeps our controller for a few seconds
+        setTimeout(connectSocket, reconnectDelay);
+        reconnectDelay = Math.min(Math.max(reconnectDelay * 2, 50), 2000);
     };
 
     socket.onerror = function (error) {
@@ -92,6 +154,40 @@ let connectSocket = () => {
     };
 }
 
+const toInt16 = (value) => Math.max(-32767, Math.min(32767, Math.round(value * 32767)));
+
+// What a frame carries: button mask, triggers and axes, quantized as on the wire
+const MASK = 0, LT = 1, RT = 2, LX = 3, LY = 4, RX = 5, RY = 6;
+const state = new Int32Array(7);
+// Last state sent to the server and drawn on screen
+const sentState = new Int32Array(7).fill(-1);
+const drawnState = new Int32Array(7).fill(-1);
+
+const sameState = (other) => {
+    for (let i = 0; i < state.length; i++) {
+        if (state[i] !== other[i]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+const encodeFrame = (flags) => {
+    frameSeq = (frameSeq + 1) & 0xffff;
+    frameView.setUint8(0, PROTOCOL_VERSION);
+    frameView.setUint8(1, flags);
+    frameView.setUint16(2, frameSeq, true);
+    frameView.setUint32(4, Math.round(performance.now() * 1000) >>> 0, true);
+    frameView.setUint32(8, state[MASK], true);
+    frameView.setUint8(12, state[LT]);
+    frameView.setUint8(13, state[RT]);
+    frameView.setInt16(14, state[LX], true);
+    frameView.setInt16(16, state[LY], true);
+    frameView.setInt16(18, state[RX], true);
+    frameView.setInt16(20, state[RY], true);
+    return frameBuffer;
+}
+
 connectSocket();
 window.addEventListener('gamepadconnected', (event) => {
     sections.pending.classList.remove('visible');
@@ -139,34 +235,121 @@ const updateController = () => {
 }
 
 
-const update = () => {
-    if (gamepadIndex !== undefined) {
-        const myGamepad = navigator.getGamepads()[gamepadIndex];
-        if (myGamepad) {
-            buttons["lx"] = myGamepad.axes[0];
-            buttons["ly"] = myGamepad.axes[1];
-            buttons["rx"] = myGamepad.axes[2];
-            buttons["ry"] = myGamepad.axes[3];
+const sample = (myGamepad) => {
+    buttons["lx"] = myGamepad.axes[0];
+    buttons["ly"] = myGamepad.axes[1];
+    buttons["rx"] = myGamepad.axes[2];
+    buttons["ry"] = myGamepad.axes[3];
 
-            myGamepad.buttons.map(e => e.pressed).forEach((isPressed, buttonIndex) => {
-                if (buttonIndex == 6 || buttonIndex == 7) {
-                    buttons[buttonIndex] = myGamepad.buttons[buttonIndex].value;
-                }
-                else if (isPressed) {
-                    buttons[buttonIndex] = true;
-                } else {
-                    buttons[buttonIndex] = false;
-                }
-            })
-            updateController();
-            if (socket.readyState == 1)
-                socket.send(JSON.stringify(buttons));
+    let mask = 0;
+    myGamepad.buttons.forEach((button, buttonIndex) => {
+        if (buttonIndex == 6 || buttonIndex == 7) {
+            buttons[buttonIndex] = button.value;
+        } else {
+            buttons[buttonIndex] = button.pressed;
+        }
+        // like the JSON format, a trigger that is not fully released counts as pressed
+        if (buttons[buttonIndex] && buttonIndex < 19) {
+            mask |= 1 << buttonIndex;
         }
+    });
+    state[MASK] = mask;
+    state[LT] = Math.round(buttons[6] * 255);
+    state[RT] = Math.round(buttons[7] * 255);
+    state[LX] = toInt16(buttons["lx"]);
+    state[LY] = toInt16(buttons["ly"]);
+    state[RX] = toInt16(buttons["rx"]);
+    state[RY] = toInt16(buttons["ry"]);
+}
+
+const poll = () => {
+    if (gamepadIndex === undefined) {
+        return;
+    }
+    const myGamepad = navigator.getGamepads()[gamepadIndex];
+    if (!myGamepad) {
+        return;
+    }
+    polls++;
+    // the browser bumps the timestamp when new data arrives; some never set it, sample every time then
+    if (!myGamepad.timestamp || myGamepad.timestamp !== lastTimestamp) {
+        lastTimestamp = myGamepad.timestamp;
+        sample(myGamepad);
+    }
+    if (socket.readyState != 1) {
+        return;
+    }
+    const now = performance.now();
+    // every change is sent, so no press or release is lost between two keepalives
+    const changed = !sameState(sentState);
+    if (changed || now - lastSend >= KEEPALIVE_INTERVAL) {
+        socket.send(protocol ? encodeFrame(changed ? 0 : FLAG_KEEPALIVE) : JSON.stringify(buttons));
+        sentState.set(state);
+        lastSend = now;
+    }
+    // servers that do not speak the binary protocol would take this for a frame
+    if (protocol && now - lastStats >= STATS_INTERVAL) {
+        socket.send(JSON.stringify({ type: 'stats', pollRate: polls * 1000 / (now - lastStats) }));
+        polls = 0;
+        lastStats = now;
+    }
+}
+
+const draw = () => {
+    const now = performance.now();
+    if (now - lastDraw >= DRAW_INTERVAL && !sameState(drawnState)) {
+        updateController();
+        drawnState.set(state);
+        lastDraw = now;
+    }
+}
+
+// Paces polling against performance.now(), skipping missed ticks instead of bursting.
+// It runs in a worker because timers on the page itself are throttled in the background.
+const timerSource = `
+let interval, deadline, timer;
+const tick = () => {
+    postMessage(0);
+    deadline += interval;
+    const now = performance.now();
+    if (deadline < now) {
+        deadline = now;
+    }
+    timer = setTimeout(tick, deadline - now);
+};
+onmessage = (event) => {
+    clearTimeout(timer);
+    interval = 1000 / event.data;
+    deadline = performance.now();
+    tick();
+};
+`;
+
+const startPolling = (rate) => {
+    try {
+        const timer = new Worker(URL.createObjectURL(new Blob([timerSource], { type: 'text/javascript' })));
+        timer.onmessage = poll;
+        timer.postMessage(rate);
+    } catch (e) {
+        console.log(`[poll] No worker (${e.message}), polling from the page`);
+        let deadline = performance.now();
+        const tick = () => {
+            poll();
+            deadline = Math.max(deadline + 1000 / rate, performance.now());
+            setTimeout(tick, deadline - performance.now());
+        };
+        tick();
     }
 }
 
 const loop = () => {
-    update();
+    if (!POLL_RATE) {
+        poll();
+    }
+    draw();
     requestAnimationFrame(loop);
 }
+if (POLL_RATE) {
+    startPolling(POLL_RATE);
+}
 loop();
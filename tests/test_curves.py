@@ -0,0 +1,74 @@
+import pytest
+
+import curves
+
+# to compare single positions, without the last one holding the output
+NO_HYSTERESIS = {name: profile._replace(hysteresis=0) for name, profile in curves.PROFILES.items()}
+
+
+def test_raw_passes_through():
+    stick = curves.Stick('raw')
+    for position in ((0, 0), (123, -456), (32767, -32767)):
+        assert stick.shape(*position) == position
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        curves.Stick('no such profile')
+
+
+@pytest.mark.parametrize('name', ['default', 'precise', 'axial'])
+def test_deadzone(name):
+    stick = curves.Stick(NO_HYSTERESIS[name])
+    assert stick.shape(0, 0) == (0, 0)
+    # 3% of full scale, inside every deadzone
+    assert stick.shape(1000, -600) == (0, 0)
+
+
+@pytest.mark.parametrize('name', ['default', 'precise', 'axial'])
+def test_full_deflection(name):
+    stick = curves.Stick(NO_HYSTERESIS[name])
+    x, y = stick.shape(32767, 0)
+    assert x == pytest.approx(32767, abs=64) and y == 0
+    x, y = stick.shape(0, -32767)
+    assert x == 0 and y == pytest.approx(-32767, abs=64)
+
+
+def test_radial_deadzone_is_circular():
+    radial, axial = curves.Stick(NO_HYSTERESIS['default']), curves.Stick(NO_HYSTERESIS['axial'])
+    # x alone is within both deadzones, the stick vector is well out of them
+    x, y = radial.shape(2000, 20000)
+    assert x > 0 and y > 0
+    x, y = axial.shape(2000, 20000)
+    assert x == 0 and y > 0
+
+
+def test_radial_keeps_the_direction():
+    stick = curves.Stick(NO_HYSTERESIS['default'])
+    for position in ((10000, 10000), (-20000, 5000), (3000, -24000)):
+        x, y = stick.shape(*position)
+        # the same angle, to within the rounding of the gain
+        assert x * position[1] == pytest.approx(y * position[0], rel=1e-3, abs=32767)
+
+
+def test_output_grows_with_the_input():
+    for name in ('default', 'precise', 'axial'):
+        stick = curves.Stick(NO_HYSTERESIS[name])
+        outputs = [stick.shape(x, 0)[0] for x in range(0, 32768, 256)]
+        assert outputs == sorted(outputs)
+
+
+def test_precise_is_finer_near_the_center():
+    default, precise = curves.Stick(NO_HYSTERESIS['default']), curves.Stick(NO_HYSTERESIS['precise'])
+    assert 0 < precise.shape(12000, 0)[0] < default.shape(12000, 0)[0]
+
+
+def test_hysteresis_holds_the_output():
+    stick = curves.Stick('default')
+    hysteresis = curves.PROFILES['default'].hysteresis
+    output = stick.shape(10000, -5000)
+    assert stick.shape(10000 + hysteresis, -5000 - hysteresis) == output
+    moved = stick.shape(10000 + hysteresis + 1, -5000)
+    assert moved != output
+    # measured from the input the output was computed from, so slow drift is followed
+    assert stick.shape(10000 + 2 * hysteresis + 1, -5000) == moved
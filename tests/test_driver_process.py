@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+
+import driver_process
+from vgamepad.win.vigem_commons import XUSB_REPORT
+
+
+@pytest.fixture
+def driver():
+    driver = driver_process.DriverProcess('loopback', pool_size=1, players=2, rate=0)
+    yield driver
+    driver.close()
+
+
+def test_acks_go_to_the_slot_of_the_frame(driver):
+    acks = {0: [], 1: []}
+    acked = threading.Event()
+    outputs = []
+    for slot in (0, 1):
+        output = driver.create_output(driver.acquire(), slot)
+
+        def ack(seq, slot=slot):
+            acks[slot].append(seq)
+            acked.set()
+        # the slot opened last is the one whose ack message the driver process handled last
+        output.on_submit = ack
+        outputs.append(output)
+    outputs[0].submit(bytes(XUSB_REPORT(wButtons=1)), seq=7)
+    assert acked.wait(5)
+    assert acks == {0: [7], 1: []}
+
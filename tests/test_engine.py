@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+from http import HTTPStatus
+
+import pytest
+import websockets
+
+import backends
+import engine
+import pool
+import protocol
+import sessions
+import translation
+
+
+def create_engine(rate=0):
+    devices = pool.DevicePool(backends.create_backend('loopback'), 1)
+    players = sessions.SessionManager(devices, max_players=2, grace=0, rate=rate)
+    return engine.Engine(players, lambda profile='default': translation.create_translator(profile=profile))
+
+
+async def serving(server, test):
+    """
+    Runs `test` with the port `server` listens on
+    """
+    stop = asyncio.Event()
+    started = asyncio.get_running_loop().create_future()
+    serve = asyncio.create_task(server.serve('127.0.0.1', 0, stop, started.set_result))
+    try:
+        return await test(await started)
+    finally:
+        stop.set()
+        await serve
+
+
+@pytest.mark.parametrize('path', ['/controller', '//controller', '/controller?x=1'])
+def test_controller_paths_go_on_with_the_handshake(path):
+    assert asyncio.run(create_engine().process_request(path, {})) is None
+
+
+@pytest.mark.parametrize('path', ['/', '//', '/?rate=250'])
+def test_index(path):
+    status, headers, body = asyncio.run(create_engine().process_request(path, {}))
+    assert status == HTTPStatus.OK
+    assert dict(headers)['Content-Type'].startswith('text/html')
+
+
+def test_slots_query_is_split_off():
+    status, headers, body = asyncio.run(create_engine().process_request('//slots?x=1', {}))
+    assert (status, json.loads(body)) == (HTTPStatus.OK, {})
+
+
+# the path pages served before the socket URL was built from location.host ask for, and the current one
+@pytest.mark.parametrize('path', ['//controller', '/controller'])
+def test_frames_are_acked_over_the_handshake(path):
+    async def test(port):
+        async with websockets.connect('ws://127.0.0.1:{}{}'.format(port, path)) as websocket:
+            await websocket.send(json.dumps({'type': 'hello', 'protocol': [protocol.PROTOCOL_VERSION], 'ack': True}))
+            welcome = json.loads(await websocket.recv())
+            await websocket.send(protocol.encode_frame(protocol.Frame(0, 7, 0, 1, 0, 0, 0, 0, 0, 0)))
+            ack = json.loads(await asyncio.wait_for(websocket.recv(), 2))
+        return welcome, ack
+    welcome, ack = asyncio.run(serving(create_engine(), test))
+    assert (welcome['type'], welcome['protocol'], welcome['slot']) == ('welcome', protocol.PROTOCOL_VERSION, 0)
+    assert ack == {'type': 'ack', 'seq': 7}
+
+
+@pytest.mark.parametrize('rate, enabled', [(250, True), (0, False)])
+def test_jitter_buffer_is_turned_on_by_the_hello(rate, enabled):
+    async def test(port):
+        async with websockets.connect('ws://127.0.0.1:{}/controller'.format(port)) as websocket:
+            await websocket.send(json.dumps({'type': 'hello', 'protocol': [protocol.PROTOCOL_VERSION], 'ack': True,
+                                             'jitter': True}))
+            welcome = json.loads(await websocket.recv())
+            await websocket.send(protocol.encode_frame(protocol.Frame(0, 7, 0, 1, 0, 0, 0, 0, 0, 0)))
+            ack = json.loads(await asyncio.wait_for(websocket.recv(), 2))
+        return welcome, ack
+    welcome, ack = asyncio.run(serving(create_engine(rate), test))
+    # without output ticks to play frames out on there is no buffer
+    assert welcome.get('jitter', False) is enabled
+    assert ack == {'type': 'ack', 'seq': 7}
+
+
+def test_malformed_messages_keep_the_connection():
+    async def test(port):
+        async with websockets.connect('ws://127.0.0.1:{}/controller'.format(port)) as websocket:
+            await websocket.send(json.dumps({'type': 'hello', 'protocol': [protocol.PROTOCOL_VERSION], 'ack': True,
+                                             'profile': ['raw']}))
+            await websocket.recv()
+            for message in (b'\x01', '{nope', '{"0": 1}', json.dumps({'type': 'stats', 'pollRate': 'x'}),
+                            '{"6": 2, "lx": 0, "ly": 0, "rx": 0, "ry": 0}',
+                            '{"lx": Infinity, "ly": 0, "rx": 0, "ry": 0}',
+                            '{"lx": %d, "ly": 0, "rx": 0, "ry": 0}' % 10 ** 400):
+                await websocket.send(message)
+            await websocket.send(protocol.encode_frame(protocol.Frame(0, 8, 0, 1, 0, 0, 0, 0, 0, 0)))
+            # the clamped trigger is a valid frame, whose ack can come first
+            while True:
+                ack = json.loads(await asyncio.wait_for(websocket.recv(), 2))
+                if ack['seq'] == 8:
+                    return ack
+    assert asyncio.run(serving(create_engine(), test)) == {'type': 'ack', 'seq': 8}
+
+
+def test_disconnect_closes_the_session_off_the_loop():
+    server = create_engine()
+    threads = []
+    close = server.players.close
+
+    def closing(session):
+        threads.append(threading.current_thread())
+        close(session)
+    server.players.close = closing
+
+    async def test(port):
+        async with websockets.connect('ws://127.0.0.1:{}/controller'.format(port)) as websocket:
+            await websocket.send(json.dumps({'type': 'hello'}))
+            await websocket.recv()
+        # no grace period: the session is closed once the server sees the connection drop
+        for _ in range(200):
+            if not server.players.sessions():
+                break
+            await asyncio.sleep(0.01)
+        return threading.current_thread()
+    loop_thread = asyncio.run(serving(server, test))
+    assert server.players.sessions() == []
+    assert threads and loop_thread not in threads
@@ -0,0 +1,80 @@
+import pytest
+
+import jitter
+import protocol
+import translation
+from vgamepad.win.vigem_commons import XUSB_REPORT_STRUCT
+
+MS = 1000000
+START = 10 ** 12
+
+
+def frame(seq, timestamp_ms, buttons=0, lx=0):
+    return protocol.Frame(0, seq, int(timestamp_ms * 1000) & 0xFFFFFFFF, buttons, 0, 0, lx, 0, 0, 0)
+
+
+def unpack(report):
+    buttons, lt, rt, lx, ly, rx, ry = XUSB_REPORT_STRUCT.unpack(report)
+    return buttons, lx
+
+
+@pytest.fixture
+def buffer():
+    return jitter.JitterBuffer(translation.create_translator(profile='raw'))
+
+
+def test_first_frame_is_sent_at_once(buffer):
+    assert unpack(buffer.push(frame(1, 0, lx=1000), START)) == (0, 1000)
+
+
+def test_button_changes_pass_straight_through(buffer):
+    buffer.push(frame(1, 0, lx=1000), START)
+    # the new buttons, with the sticks as last played out
+    buttons, lx = unpack(buffer.push(frame(2, 8, buttons=1, lx=9000), START + 8 * MS))
+    assert buttons != 0 and lx == 1000
+    # the sticks alone are not sent on arrival
+    assert buffer.push(frame(3, 16, buttons=1, lx=12000), START + 16 * MS) is None
+
+
+def test_sticks_are_interpolated_between_frames(buffer):
+    buffer.push(frame(1, 0), START)
+    buffer.push(frame(2, 10, lx=10000), START + 10 * MS)
+    assert buffer.delay == 0
+    report, received, seq = buffer.sample(START + 5 * MS)
+    assert unpack(report) == (0, 5000)
+    assert (received, seq) == (START + 10 * MS, 2)
+    report, received, seq = buffer.sample(START + 10 * MS)
+    assert unpack(report) == (0, 10000)
+    # nothing changed since
+    assert buffer.sample(START + 11 * MS) is None
+
+
+def test_clean_stream_adds_no_delay(buffer):
+    for seq in range(100):
+        buffer.push(frame(seq, seq * 4, lx=seq * 100), START + seq * 4 * MS)
+    assert buffer.delay == 0
+    report, received, seq = buffer.sample(START + 99 * 4 * MS)
+    assert unpack(report) == (0, 9900)
+
+
+def test_bursts_raise_the_delay(buffer):
+    # frames produced every 4 ms, delivered 5 at a time every 20 ms
+    for seq in range(200):
+        buffer.push(frame(seq, seq * 4, lx=seq * 100), START + (seq // 5 + 1) * 20 * MS)
+    assert 5 * MS < buffer.delay <= jitter.MAX_DELAY
+
+
+def test_older_frames_are_ignored(buffer):
+    buffer.push(frame(1, 0), START)
+    buffer.push(frame(2, 10, lx=10000), START + 10 * MS)
+    assert buffer.push(frame(3, 5, buttons=1, lx=-10000), START + 11 * MS) is None
+    report, received, seq = buffer.sample(START + 20 * MS)
+    assert unpack(report) == (0, 10000)
+
+
+def test_timestamps_wrap_around(buffer):
+    wrap = 0x100000000 / 1000
+    buffer.push(frame(1, wrap - 2), START)
+    buffer.push(frame(2, wrap + 2, lx=10000), START + 4 * MS)
+    report, received, seq = buffer.sample(START + 4 * MS)
+    assert (unpack(report), seq) == ((0, 10000), 2)
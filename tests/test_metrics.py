@@ -0,0 +1,36 @@
+import pytest
+
+import metrics
+
+
+def test_empty():
+    assert metrics.Histogram().percentile(0.5) == 0
+
+
+def test_small_values_are_exact():
+    histogram = metrics.Histogram()
+    for value in range(1, 11):
+        histogram.record(value)
+    assert histogram.percentile(0.5) == pytest.approx(5, abs=0.5)
+    assert histogram.percentile(1) == pytest.approx(10, abs=0.5)
+    assert (histogram.count, histogram.total) == (10, 55)
+
+
+@pytest.mark.parametrize('q', [0.5, 0.9, 0.99, 0.999])
+def test_percentiles_within_bucket_precision(q):
+    histogram = metrics.Histogram()
+    values = range(1000, 1000001, 100)
+    for value in values:
+        histogram.record(value)
+    expected = values[round(q * len(values)) - 1]
+    # 5 sub bits: buckets are at most about 6% of their value wide, the middle is within half that
+    assert histogram.percentile(q) == pytest.approx(expected, rel=0.035)
+
+
+def test_out_of_range_values_are_clamped():
+    histogram = metrics.Histogram(max_bits=20)
+    histogram.record(-5)
+    histogram.record(1 << 30)
+    assert histogram.percentile(0) < 1
+    assert histogram.percentile(1) <= histogram.max_value
+    assert histogram.total == histogram.max_value
@@ -0,0 +1,64 @@
+import asyncio
+
+import notify
+
+
+def test_put_without_a_reader_is_dropped():
+    mailbox = notify.Mailbox()
+    mailbox.put('feedback', 1)
+    assert mailbox.dropped == 1
+
+
+def test_latest_value_wins():
+    async def run():
+        mailbox = notify.Mailbox()
+        reader = mailbox.attach(asyncio.get_running_loop())
+        mailbox.put('feedback', 1)
+        mailbox.put('feedback', 2)
+        mailbox.put('ack', 5)
+        assert await mailbox.get(reader) == [('feedback', 2), ('ack', 5)]
+        # the same as the last one delivered
+        mailbox.put('feedback', 2)
+        mailbox.put('ack', 6)
+        assert await mailbox.get(reader) == [('ack', 6)]
+        return mailbox
+    mailbox = asyncio.run(run())
+    assert (mailbox.coalesced, mailbox.dropped) == (2, 0)
+
+
+def test_full_mailbox_drops_the_oldest_kind():
+    async def run():
+        mailbox = notify.Mailbox(maxsize=2)
+        reader = mailbox.attach(asyncio.get_running_loop())
+        for kind in ('a', 'b', 'c'):
+            mailbox.put(kind, 1)
+        assert await mailbox.get(reader) == [('b', 1), ('c', 1)]
+        return mailbox
+    mailbox = asyncio.run(run())
+    assert mailbox.dropped == 1
+
+
+def test_detached_reader_gets_none():
+    async def run():
+        mailbox = notify.Mailbox()
+        reader = mailbox.attach(asyncio.get_running_loop())
+        waiting = asyncio.create_task(mailbox.get(reader))
+        await asyncio.sleep(0)
+        mailbox.detach()
+        assert await asyncio.wait_for(waiting, 1) is None
+        mailbox.put('feedback', 1)
+        return mailbox
+    mailbox = asyncio.run(run())
+    assert mailbox.dropped == 1
+
+
+def test_reattached_reader_gets_the_state_again():
+    async def run():
+        mailbox = notify.Mailbox()
+        reader = mailbox.attach(asyncio.get_running_loop())
+        mailbox.put('feedback', 1)
+        await mailbox.get(reader)
+        reader = mailbox.attach(asyncio.get_running_loop())
+        mailbox.put('feedback', 1)
+        return await mailbox.get(reader)
+    assert asyncio.run(run()) == [('feedback', 1)]
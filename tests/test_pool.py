@@ -0,0 +1,27 @@
+import time
+
+import backends
+import pool
+
+
+def test_leased_device_is_replaced_in_the_background():
+    devices = pool.DevicePool(backends.create_backend('loopback'), 1)
+    devices.fill()
+    assert devices.idle() == 1
+    devices.acquire()
+    deadline = time.monotonic() + 2
+    while devices.idle() < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert devices.leased() == 1
+
+
+def test_release_keeps_at_most_size_idle():
+    devices = pool.DevicePool(backends.create_backend('loopback'), 1)
+    devices.fill()
+    leased = [devices.acquire(), devices.acquire()]
+    for device in leased:
+        devices.release(device)
+        # a released device is neutral and no longer calls back
+        assert device.callback is None
+    assert (devices.idle(), devices.leased()) == (1, 0)
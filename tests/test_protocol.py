@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import protocol
+
+
+def test_frame_round_trip():
+    frame = protocol.Frame(protocol.FLAG_KEEPALIVE, 65535, 0xFFFFFFFF, (1 << protocol.BUTTON_COUNT) - 1,
+                           255, 0, -32767, 32767, 0, -1)
+    data = protocol.encode_frame(frame)
+    assert len(data) == protocol.FRAME_SIZE
+    assert protocol.decode_frame(data) == frame
+
+
+@pytest.mark.parametrize('size', [0, protocol.FRAME_SIZE - 1, protocol.FRAME_SIZE + 1])
+def test_wrong_size_is_rejected(size):
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_frame(bytes(size))
+
+
+def test_wrong_version_is_rejected():
+    data = bytearray(protocol.encode_frame(protocol.Frame(0, 1, 0, 0, 0, 0, 0, 0, 0, 0)))
+    data[0] = protocol.PROTOCOL_VERSION + 1
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_frame(bytes(data))
+
+
+def test_legacy_message():
+    message = {'0': True, '6': 0.5, '7': 0, '12': True, 'lx': 1.0, 'ly': -1.0, 'rx': 2.0, 'ry': 0}
+    frame = protocol.frame_from_message(message)
+    # the left trigger counts as pressed, the right one does not
+    assert frame.buttons == 1 | 1 << 6 | 1 << 12
+    assert (frame.lt, frame.rt) == (127, 0)
+    # out of range values are clamped
+    assert (frame.lx, frame.ly, frame.rx, frame.ry) == (32767, -32767, 32767, 0)
+
+
+@pytest.mark.parametrize('trigger, value', [(2, 255), (-0.5, 0), (1e300, 255)])
+def test_legacy_triggers_are_clamped(trigger, value):
+    frame = protocol.frame_from_message({'6': trigger, '7': trigger, 'lx': 0, 'ly': 0, 'rx': 0, 'ry': 0})
+    assert (frame.lt, frame.rt) == (value, value)
+    # and fit in a binary frame
+    assert protocol.decode_frame(protocol.encode_frame(frame)) == frame
+
+
+@pytest.mark.parametrize('text', [
+    '{"lx": Infinity, "ly": 0, "rx": 0, "ry": 0}',
+    '{"lx": 0, "ly": NaN, "rx": 0, "ry": 0}',
+    '{"6": -Infinity, "lx": 0, "ly": 0, "rx": 0, "ry": 0}',
+    '{"lx": 1e400, "ly": 0, "rx": 0, "ry": 0}',
+])
+def test_legacy_non_finite_values_are_rejected(text):
+    with pytest.raises(protocol.ProtocolError):
+        protocol.frame_from_message(json.loads(text))
+
+
+def test_negotiate():
+    assert protocol.negotiate({'type': 'hello', 'protocol': [protocol.PROTOCOL_VERSION, 99]}) == protocol.PROTOCOL_VERSION
+    assert protocol.negotiate({'type': 'hello', 'protocol': [99]}) is None
+    assert protocol.negotiate({'type': 'hello'}) is None
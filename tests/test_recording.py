@@ -0,0 +1,99 @@
+import ctypes
+
+import pytest
+
+import backends
+import recording
+import scheduler
+from vgamepad.win.vigem_commons import VIGEM_TARGET_TYPE, XUSB_REPORT, DS4_REPORT
+
+REPORTS = [bytes(XUSB_REPORT(wButtons=buttons, sThumbLX=buttons * 100)) for buttons in (1, 2, 4)]
+
+
+def write(path, records, target_type=VIGEM_TARGET_TYPE.Xbox360Wired):
+    recorder = recording.Recorder(str(path), target_type)
+    for timestamp, data in records:
+        recorder.record(timestamp, data)
+    recorder.close()
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'player1.rec'
+    records = list(zip((1000, 2000000, 5000000), REPORTS))
+    write(path, records)
+    played = recording.Recording(str(path))
+    assert played.target_type == VIGEM_TARGET_TYPE.Xbox360Wired
+    assert played.report_type is XUSB_REPORT
+    assert len(played) == 3
+    assert [(timestamp, bytes(data)) for timestamp, data in played] == records
+    assert played[-1][0] == 5000000
+    assert played.duration() == pytest.approx(0.004999)
+    with pytest.raises(IndexError):
+        played[3]
+    played.close()
+
+
+def test_ds4(tmp_path):
+    path = tmp_path / 'player1.rec'
+    report = bytes(DS4_REPORT(bThumbLX=200))
+    write(path, [(1, report)], VIGEM_TARGET_TYPE.DualShock4Wired)
+    played = recording.Recording(str(path))
+    assert (played.target_type, played.report_size) == (VIGEM_TARGET_TYPE.DualShock4Wired, ctypes.sizeof(DS4_REPORT))
+    assert bytes(played[0][1]) == report
+    played.close()
+
+
+def test_a_recorder_appends(tmp_path):
+    path = tmp_path / 'player1.rec'
+    write(path, [(1, REPORTS[0])])
+    write(path, [(2, REPORTS[1])])
+    played = recording.Recording(str(path))
+    assert [bytes(data) for timestamp, data in played] == REPORTS[:2]
+    played.close()
+    with pytest.raises(recording.RecordingError):
+        recording.Recorder(str(path), VIGEM_TARGET_TYPE.DualShock4Wired)
+
+
+def test_a_record_cut_short_is_ignored(tmp_path):
+    path = tmp_path / 'player1.rec'
+    write(path, [(1, REPORTS[0]), (2, REPORTS[1])])
+    with open(path, 'r+b') as f:
+        f.truncate(path.stat().st_size - 3)
+    played = recording.Recording(str(path))
+    assert len(played) == 1
+    played.close()
+
+
+@pytest.mark.parametrize('content', [b'', b'SWRC', b'NOPE' + bytes(12), b'SWRC\x09' + bytes(11)])
+def test_not_a_recording(tmp_path, content):
+    path = tmp_path / 'player1.rec'
+    path.write_bytes(content)
+    # a RecordingError, or mmap's ValueError for an empty file
+    with pytest.raises(ValueError):
+        recording.Recording(str(path))
+
+
+def test_scheduler_records_what_it_submits(tmp_path):
+    path = tmp_path / 'player1.rec'
+    device = backends.create_backend('loopback').create_device()
+    output = scheduler.OutputScheduler(device, rate=0, recorder=recording.Recorder(str(path)))
+    for report in REPORTS:
+        output.submit(report)
+    output.close()
+    played = recording.Recording(str(path))
+    assert [bytes(data) for timestamp, data in played] == REPORTS
+    played.close()
+
+
+def test_replay_submits_every_report_in_order(tmp_path):
+    path = tmp_path / 'player1.rec'
+    write(path, list(zip((0, 1000000, 2000000), REPORTS)))
+    played = recording.Recording(str(path))
+    device = backends.create_backend('loopback').create_device()
+    lateness, submit_time = recording.replay(played, device)
+    assert [data for timestamp, data in list(device.reports)[1:]] == REPORTS
+    # recorded 1 ms apart (the device timestamps each report once it is through, hence the margin)
+    replayed = [timestamp for timestamp, data in list(device.reports)[1:]]
+    assert replayed[2] - replayed[0] >= 0.0018
+    assert lateness.count == submit_time.count == 3
+    played.close()
@@ -0,0 +1,58 @@
+import driver_process
+from driver_process import ENTRY, ENTRIES_OFFSET, RING_SIZE, Ring
+
+
+def rings():
+    buffer = bytearray(driver_process.SLOT_SIZE * 2)
+    # slot 1, so that the ring's offset is exercised
+    return Ring(buffer, 1), Ring(buffer, 1)
+
+
+def seqs(entries):
+    return [seq for report, received, seq in entries]
+
+
+def test_reports_come_out_in_order():
+    producer, consumer = rings()
+    producer.put(b'\x01\x02', received=123, seq=7)
+    producer.put(b'\x03')
+    assert consumer.take() == ([(b'\x01\x02', 123, 7), (b'\x03', None, None)], 0)
+    assert consumer.take() == ((), 0)
+
+
+def test_wrap_around():
+    producer, consumer = rings()
+    for seq in range(5 * RING_SIZE):
+        producer.put(bytes([seq % 256]), seq=seq % 65536)
+        entries, lost = consumer.take()
+        assert (seqs(entries), lost) == ([seq], 0)
+
+
+def test_overwrite_keeps_the_newest():
+    producer, consumer = rings()
+    for seq in range(3 * RING_SIZE):
+        producer.put(b'\x00', seq=seq)
+    entries, lost = consumer.take()
+    # the place of the next report cannot be trusted, so one less than RING_SIZE is kept
+    assert seqs(entries) == list(range(2 * RING_SIZE + 1, 3 * RING_SIZE))
+    assert lost == 2 * RING_SIZE + 1
+
+
+def test_report_being_written_is_dropped():
+    producer, consumer = rings()
+    for seq in range(RING_SIZE):
+        producer.put(b'\x00', seq=seq)
+    # the producer is halfway through the next report: written in place of the oldest, not published yet
+    ENTRY.pack_into(producer.buffer, producer.base + ENTRIES_OFFSET + RING_SIZE % RING_SIZE * ENTRY.size,
+                    0, 0xFFFF, 0, 0, b'')
+    entries, lost = consumer.take()
+    assert seqs(entries) == list(range(1, RING_SIZE))
+    assert lost == 1
+
+
+def test_skip():
+    producer, consumer = rings()
+    producer.put(b'\x00', seq=1)
+    consumer.skip()
+    producer.put(b'\x00', seq=2)
+    assert seqs(consumer.take()[0]) == [2]
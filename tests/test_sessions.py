@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+import backends
+import pool
+import sessions
+
+
+def manager(max_players=2, grace=10.0):
+    devices = pool.DevicePool(backends.create_backend('loopback'), 1)
+    devices.fill()
+    # rate 0: reports go straight to the device, no scheduler thread
+    return sessions.SessionManager(devices, max_players, grace, rate=0)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_slots_are_assigned_in_order():
+    players = manager()
+    first, second = players.open('a'), players.open('b')
+    assert (first.slot, second.slot) == (0, 1)
+    assert first.device is not second.device
+    assert sorted(players.slots()) == [0, 1]
+
+
+def test_slot_exhaustion():
+    players = manager(max_players=2)
+    players.open('a')
+    players.open('b')
+    with pytest.raises(sessions.SlotsFull):
+        players.open('c')
+
+
+def test_closed_slot_is_reused():
+    players = manager(max_players=1)
+    session = players.open('a')
+    players.close(session)
+    assert players.open('b').slot == session.slot
+    assert players.devices.leased() == 1
+
+
+def test_resume_gets_the_same_device():
+    players = manager()
+    session = players.open('a')
+    players.detach(session, 'a')
+    assert players.slots()[session.slot]['connected'] is False
+    resumed = players.open('b', session.token)
+    assert resumed is session
+    assert resumed.connection == 'b'
+    assert resumed.expiry is None
+    assert players.slots()[session.slot]['connected'] is True
+
+
+def test_unknown_token_starts_a_new_session():
+    players = manager()
+    session = players.open('a', 'no such token')
+    assert session.token != 'no such token'
+
+
+def test_disconnected_session_keeps_its_slot_until_it_expires():
+    players = manager(max_players=1, grace=0.1)
+    session = players.open('a')
+    players.detach(session, 'a')
+    with pytest.raises(sessions.SlotsFull):
+        players.open('b')
+    wait_for(lambda: not players.sessions())
+    # expired: the token no longer resumes it and its device is back in the pool
+    assert players.open('b', session.token) is not session
+    assert session.device.callback is None
+
+
+def test_detach_of_a_replaced_connection_is_ignored():
+    players = manager(grace=0)
+    session = players.open('a')
+    players.open('b', session.token)
+    players.detach(session, 'a')
+    assert players.sessions() == [session]
+
+
+def test_no_grace_closes_at_once():
+    players = manager(grace=0)
+    session = players.open('a')
+    players.detach(session, 'a')
+    assert players.sessions() == []
+    assert players.devices.leased() == 0
+
+
+def test_feedback_reaches_the_mailbox():
+    players = manager()
+    session = players.open('a')
+    done = threading.Event()
+    # from the driver's thread, with no reader attached
+    threading.Thread(target=lambda: (session.device.notify(10, 20), done.set())).start()
+    done.wait(1)
+    assert session.mailbox.dropped == 1
@@ -0,0 +1,42 @@
+import json
+import random
+
+import protocol
+import translation
+from vgamepad.win.vigem_commons import XUSB_REPORT
+
+
+def legacy(message):
+    # the per-key chain server.py and controller.py used before the compiled tables
+    report = XUSB_REPORT()
+    report.sThumbLX = int(message['lx'] * 32767)
+    report.sThumbLY = -int(message['ly'] * 32767)
+    report.sThumbRX = int(message['rx'] * 32767)
+    report.sThumbRY = -int(message['ry'] * 32767)
+    for index, button in translation.X360_BUTTONS.items():
+        if message[str(index)] == True:  # noqa: E712
+            report.wButtons = report.wButtons | button
+        elif message[str(index)] == False:  # noqa: E712
+            report.wButtons = report.wButtons & ~button
+    report.bLeftTrigger = int(message['6'] * 255)
+    report.bRightTrigger = int(message['7'] * 255)
+    return bytes(report)
+
+
+def messages(count, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        message = {str(index): rng.random() < 0.5 for index in range(protocol.BUTTON_COUNT)}
+        message.update({'6': rng.random(), '7': rng.random()})
+        message.update({axis: rng.uniform(-1, 1) for axis in ('lx', 'ly', 'rx', 'ry')})
+        yield message
+
+
+def test_tables_match_the_legacy_chain():
+    translator = translation.create_translator(profile='raw')
+    for message in messages(1000):
+        expected = legacy(message)
+        assert translator.translate(protocol.frame_from_message(json.loads(json.dumps(message)))) == expected
+        # the binary protocol carries the same values
+        frame = protocol.decode_frame(protocol.encode_frame(protocol.frame_from_message(message)))
+        assert translator.translate(frame) == expected
@@ -0,0 +1,112 @@
+import pytest
+
+import backends
+import engine
+import pool
+import protocol
+import sessions
+import translation
+import udp
+
+
+@pytest.mark.parametrize('seq, last, newer', [
+    (1, 0, True),
+    (0, 0, False),
+    (0, 1, False),
+    (0, 0xFFFF, True),
+    (5, 0xFFF0, True),
+    (0xFFF0, 5, False),
+    (0x7FFF, 0, True),
+    (0x8000, 0, False),
+])
+def test_is_newer(seq, last, newer):
+    assert udp.is_newer(seq, last) is newer
+
+
+class Transport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+
+@pytest.fixture
+def server():
+    devices = pool.DevicePool(backends.create_backend('loopback'), 1)
+    players = sessions.SessionManager(devices, grace=10, rate=0)
+    server = engine.Engine(players, lambda profile='raw': translation.create_translator(profile=profile))
+    server.udp = udp.DatagramServer(server)
+    server.udp.connection_made(Transport())
+    return server
+
+
+def open_session(server):
+    session = server.players.open('websocket')
+    session.translator = server.translators()
+    return session
+
+
+def datagram(session, seq, buttons=1):
+    return session.udp_key + protocol.encode_frame(protocol.Frame(0, seq, 0, buttons, 0, 0, 0, 0, 0, 0))
+
+
+def test_frames_in_order_are_applied(server):
+    session = open_session(server)
+    for seq in (1, 2, 3):
+        server.udp.datagram_received(datagram(session, seq, buttons=seq), ('10.0.0.2', 4000))
+    assert session.metrics.frames_in == 3
+    assert session.udp_address == ('10.0.0.2', 4000)
+
+
+def test_late_and_duplicate_frames_are_dropped(server):
+    session = open_session(server)
+    address = ('10.0.0.2', 4000)
+    for seq in (5, 5, 4, 6):
+        server.udp.datagram_received(datagram(session, seq), address)
+    assert (session.metrics.frames_in, session.metrics.datagrams_dropped) == (2, 2)
+    assert session.udp_seq == 6
+
+
+def test_sequence_wraps_around(server):
+    session = open_session(server)
+    address = ('10.0.0.2', 4000)
+    for seq in (0xFFFE, 0xFFFF, 0, 1):
+        server.udp.datagram_received(datagram(session, seq), address)
+    assert (session.metrics.frames_in, session.metrics.datagrams_dropped) == (4, 0)
+
+
+def test_new_address_starts_the_sequence_over(server):
+    session = open_session(server)
+    server.udp.datagram_received(datagram(session, 100), ('10.0.0.2', 4000))
+    # the client reopened its socket, or roamed to another network
+    server.udp.datagram_received(datagram(session, 1), ('10.0.0.3', 4001))
+    assert (session.metrics.frames_in, session.metrics.datagrams_dropped) == (2, 0)
+    assert session.udp_address == ('10.0.0.3', 4001)
+
+
+def test_invalid_datagrams_are_ignored(server):
+    session = open_session(server)
+    address = ('10.0.0.2', 4000)
+    good = datagram(session, 1)
+    server.udp.datagram_received(good[:-1], address)
+    server.udp.datagram_received(bytes(udp.KEY_SIZE) + good[udp.KEY_SIZE:], address)
+    wrong_version = bytearray(good)
+    wrong_version[udp.KEY_SIZE] = protocol.PROTOCOL_VERSION + 1
+    server.udp.datagram_received(bytes(wrong_version), address)
+    assert session.metrics.frames_in == 0
+    assert session.udp_address is None
+
+
+def test_frames_of_a_disconnected_session_are_ignored(server):
+    session = open_session(server)
+    server.players.detach(session, 'websocket')
+    server.udp.datagram_received(datagram(session, 1), ('10.0.0.2', 4000))
+    assert session.metrics.frames_in == 0
+
+
+def test_feedback_goes_to_the_last_address(server):
+    session = open_session(server)
+    server.udp.datagram_received(datagram(session, 1), ('10.0.0.2', 4000))
+    server.udp.feedback(session, {'lm': 10, 'sm': 20, 'led': 1})
+    assert server.udp.transport.sent == [(session.udp_key + bytes([udp.FEEDBACK, 10, 20, 1]), ('10.0.0.2', 4000))]
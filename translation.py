@@ -0,0 +1,219 @@
+"""
+Frame -> report translation
+
+A mapping (browser Gamepad button index -> report button bit, frame axis -> report
+field with a scale and sign) is compiled once into lookup tables so that a whole
+report is built in a single pass per frame instead of one read-modify-write of the
+ctypes report per button. Reports are packed straight to the driver's layout and
+sent with the device's update_from_buffer(), no ctypes structure is built. Sticks go through the lookup tables of a curves profile
+on the way, shared by the int16 (Xbox 360) and byte (DualShock 4) report formats.
+
+Translators hold each stick's hysteresis state, a session needs its own.
+"""
+
+import curves
+from protocol import BUTTON_COUNT, Frame
+from vgamepad.win.vigem_commons import (XUSB_BUTTON, XUSB_REPORT_STRUCT, DS4_BUTTONS, DS4_SPECIAL_BUTTONS,
+                                        DS4_DPAD_DIRECTIONS, DS4_REPORT_STRUCT, VIGEM_TARGET_TYPE)
+
+# Browser standard mapping (https://w3c.github.io/gamepad/#remapping) to Xbox 360
+X360_BUTTONS = {
+    0: XUSB_BUTTON.XUSB_GAMEPAD_A,
+    1: XUSB_BUTTON.XUSB_GAMEPAD_B,
+    2: XUSB_BUTTON.XUSB_GAMEPAD_X,
+    3: XUSB_BUTTON.XUSB_GAMEPAD_Y,
+    4: XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER,
+    5: XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER,
+    8: XUSB_BUTTON.XUSB_GAMEPAD_BACK,
+    9: XUSB_BUTTON.XUSB_GAMEPAD_START,
+    10: XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB,
+    11: XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB,
+    12: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP,
+    13: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN,
+    14: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT,
+    15: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT,
+    16: XUSB_BUTTON.XUSB_GAMEPAD_GUIDE,
+}
+
+# Report field order of XUSB_REPORT -> (frame axis, scale and sign); the browser's
+# +y is down while XInput's is up
+X360_AXES = (
+    ('lx', 1),
+    ('ly', -1),
+    ('rx', 1),
+    ('ry', -1),
+)
+
+DS4_BUTTON_MAP = {
+    0: DS4_BUTTONS.DS4_BUTTON_CROSS,
+    1: DS4_BUTTONS.DS4_BUTTON_CIRCLE,
+    2: DS4_BUTTONS.DS4_BUTTON_SQUARE,
+    3: DS4_BUTTONS.DS4_BUTTON_TRIANGLE,
+    4: DS4_BUTTONS.DS4_BUTTON_SHOULDER_LEFT,
+    5: DS4_BUTTONS.DS4_BUTTON_SHOULDER_RIGHT,
+    6: DS4_BUTTONS.DS4_BUTTON_TRIGGER_LEFT,
+    7: DS4_BUTTONS.DS4_BUTTON_TRIGGER_RIGHT,
+    8: DS4_BUTTONS.DS4_BUTTON_SHARE,
+    9: DS4_BUTTONS.DS4_BUTTON_OPTIONS,
+    10: DS4_BUTTONS.DS4_BUTTON_THUMB_LEFT,
+    11: DS4_BUTTONS.DS4_BUTTON_THUMB_RIGHT,
+}
+
+DS4_SPECIAL_MAP = {
+    16: DS4_SPECIAL_BUTTONS.DS4_SPECIAL_BUTTON_PS,
+    17: DS4_SPECIAL_BUTTONS.DS4_SPECIAL_BUTTON_TOUCHPAD,
+}
+
+# DS4 axes are bytes with +y down, like the browser
+DS4_AXES = (
+    ('lx', 1),
+    ('ly', 1),
+    ('rx', 1),
+    ('ry', 1),
+)
+
+# Browser d-pad buttons 12-15 (up, down, left, right) as bits of the hat table index
+DPAD_FIRST_BUTTON = 12
+DPAD_UP, DPAD_DOWN, DPAD_LEFT, DPAD_RIGHT = 1, 2, 4, 8
+
+
+def compile_buttons(mapping):
+    """
+    Compiles a {button index: bit} mapping into one 256 entry table per byte of the frame's button mask
+
+    :param: the mapping
+    :return: a tuple of 3 tables, the report bits are the OR of table[i][(mask >> 8 * i) & 0xFF]
+    """
+    tables = []
+    for chunk in range((BUTTON_COUNT + 7) // 8):
+        table = []
+        for value in range(256):
+            bits = 0
+            for offset in range(8):
+                if value & (1 << offset):
+                    bits |= int(mapping.get(chunk * 8 + offset, 0))
+            table.append(bits)
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+def compile_hat():
+    """
+    :return: a 16 entry table from the d-pad bits to a DS4_DPAD_DIRECTIONS value
+    """
+    directions = {
+        (0, 0): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NONE,
+        (0, -1): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NORTH,
+        (1, -1): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NORTHEAST,
+        (1, 0): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_EAST,
+        (1, 1): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_SOUTHEAST,
+        (0, 1): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_SOUTH,
+        (-1, 1): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_SOUTHWEST,
+        (-1, 0): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_WEST,
+        (-1, -1): DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NORTHWEST,
+    }
+    table = []
+    for bits in range(16):
+        # opposite directions cancel out
+        x = bool(bits & DPAD_RIGHT) - bool(bits & DPAD_LEFT)
+        y = bool(bits & DPAD_DOWN) - bool(bits & DPAD_UP)
+        table.append(int(directions[(x, y)]))
+    return tuple(table)
+
+
+def compile_axes(axes):
+    """
+    :param: a sequence of (frame axis name, scale)
+    :return: the same with the name replaced by its index in a Frame
+    """
+    return tuple((Frame._fields.index(name), scale) for name, scale in axes)
+
+
+def _clamp16(value):
+    return -32768 if value < -32768 else 32767 if value > 32767 else value
+
+
+class X360Translator:
+    """
+    Builds XUSB_REPORTs from Frames
+    """
+    report_struct = XUSB_REPORT_STRUCT
+    target_type = VIGEM_TARGET_TYPE.Xbox360Wired
+
+    def __init__(self, buttons=X360_BUTTONS, axes=X360_AXES, profile='default'):
+        self.tables = compile_buttons(buttons)
+        self.axes = compile_axes(axes)
+        self.left = curves.Stick(profile)
+        self.right = curves.Stick(profile)
+
+    def translate(self, frame):
+        """
+        :param: a protocol.Frame
+        :return: the bytes of the matching XUSB_REPORT
+        """
+        t0, t1, t2 = self.tables
+        mask = frame.buttons
+        (ax, sx), (ay, sy), (bx, tx), (by, ty) = self.axes
+        lx, ly = self.left.shape(frame[ax], frame[ay])
+        rx, ry = self.right.shape(frame[bx], frame[by])
+        return XUSB_REPORT_STRUCT.pack(
+            t0[mask & 0xFF] | t1[(mask >> 8) & 0xFF] | t2[(mask >> 16) & 0xFF],
+            frame.lt,
+            frame.rt,
+            _clamp16(lx * sx),
+            _clamp16(ly * sy),
+            _clamp16(rx * tx),
+            _clamp16(ry * ty))
+
+
+class DS4Translator:
+    """
+    Builds DS4_REPORTs from Frames
+    """
+    report_struct = DS4_REPORT_STRUCT
+    target_type = VIGEM_TARGET_TYPE.DualShock4Wired
+
+    def __init__(self, buttons=DS4_BUTTON_MAP, special=DS4_SPECIAL_MAP, axes=DS4_AXES, profile='default'):
+        self.tables = compile_buttons(buttons)
+        self.special = compile_buttons(special)
+        self.hat = compile_hat()
+        self.axes = compile_axes(axes)
+        self.left = curves.Stick(profile)
+        self.right = curves.Stick(profile)
+
+    def translate(self, frame):
+        """
+        :param: a protocol.Frame
+        :return: the bytes of the matching DS4_REPORT
+        """
+        t0, t1, t2 = self.tables
+        s0, s1, s2 = self.special
+        mask = frame.buttons
+        (ax, sx), (ay, sy), (bx, tx), (by, ty) = self.axes
+        lx, ly = self.left.shape(frame[ax], frame[ay])
+        rx, ry = self.right.shape(frame[bx], frame[by])
+        return DS4_REPORT_STRUCT.pack(
+            (_clamp16(lx * sx) + 32768) >> 8,
+            (_clamp16(ly * sy) + 32768) >> 8,
+            (_clamp16(rx * tx) + 32768) >> 8,
+            (_clamp16(ry * ty) + 32768) >> 8,
+            t0[mask & 0xFF] | t1[(mask >> 8) & 0xFF] | t2[(mask >> 16) & 0xFF]
+            | self.hat[(mask >> DPAD_FIRST_BUTTON) & 0xF],
+            s0[mask & 0xFF] | s1[(mask >> 8) & 0xFF] | s2[(mask >> 16) & 0xFF],
+            frame.lt,
+            frame.rt)
+
+
+TRANSLATORS = {
+    VIGEM_TARGET_TYPE.Xbox360Wired: X360Translator,
+    VIGEM_TARGET_TYPE.DualShock4Wired: DS4Translator,
+}
+
+
+def create_translator(target_type=VIGEM_TARGET_TYPE.Xbox360Wired, profile='default'):
+    """
+    :param target_type: a VIGEM_TARGET_TYPE
+    :param profile: the curves profile (or its name) applied to the sticks
+    :return: a translator for that kind of device, with the default mapping
+    """
+    return TRANSLATORS[target_type](profile=profile)
@@ -0,0 +1,73 @@
+"""
+UDP transport for native clients
+
+A lost TCP segment holds back every later frame on the websocket until it is
+retransmitted. Over UDP a lost frame is simply superseded by the next one: the
+server applies the newest frame it has seen and drops late and duplicate ones.
+
+The websocket stays the control channel. A client says hello there as usual; the
+welcome carries "udp_port" and a per-session "udp_key" (hex). Datagrams are:
+
+  client -> server  key (8 bytes) + a binary frame, see protocol.FRAME_STRUCT
+  server -> client  key (8 bytes) + kind (1 byte) + payload
+
+The only server kind is FEEDBACK, with large motor, small motor and LED bytes.
+Frames are accepted only while the session's websocket is connected, and
+feedback goes to the address the last accepted frame came from.
+"""
+
+import asyncio
+import struct
+import time
+
+import protocol
+
+KEY_SIZE = 8
+FEEDBACK = 1
+FEEDBACK_STRUCT = struct.Struct('<BBBB')
+
+
+def is_newer(seq, last):
+    """
+    :return: True if the 16 bit sequence number `seq` comes after `last`, allowing for wrap-around
+    """
+    return 0 < ((seq - last) & 0xFFFF) < 0x8000
+
+
+class DatagramServer(asyncio.DatagramProtocol):
+    def __init__(self, engine):
+        """
+        :param: the engine.Engine frames are handed to
+        """
+        self.engine = engine
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        received = time.perf_counter_ns()
+        if len(data) != KEY_SIZE + protocol.FRAME_SIZE:
+            return
+        session = self.engine.players.find(data[:KEY_SIZE])
+        if session is None or session.connection is None:
+            return
+        try:
+            frame = protocol.decode_frame(data[KEY_SIZE:])
+        except protocol.ProtocolError:
+            return
+        if address != session.udp_address:
+            # new client socket or roaming, its sequence starts over
+            session.udp_address = address
+        elif not is_newer(frame.seq, session.udp_seq):
+            session.metrics.datagrams_dropped += 1
+            return
+        session.udp_seq = frame.seq
+        self.engine.input(session, frame, received, time.perf_counter_ns())
+
+    def feedback(self, session, value):
+        """
+        Sends a feedback notification to the session's UDP address
+        """
+        self.transport.sendto(session.udp_key + FEEDBACK_STRUCT.pack(FEEDBACK, value['lm'], value['sm'], value['led']),
+                              session.udp_address)
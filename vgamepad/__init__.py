@@ -1,2 +1,38 @@
-from vgamepad.win.virtual_gamepad import VX360Gamepad, VDS4Gamepad
+import threading
+
 from vgamepad.win.vigem_commons import VIGEM_TARGET_TYPE, XUSB_BUTTON, DS4_BUTTONS, DS4_SPECIAL_BUTTONS, DS4_DPAD_DIRECTIONS
+
+# virtual_gamepad (and the ViGEmClient bindings it pulls in) is imported on first use, not by
+# every module that only needs the report structures from vigem_commons
+_LAZY = ('VX360Gamepad', 'VDS4Gamepad', 'get_vbus')
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    from vgamepad.win import virtual_gamepad
+    return getattr(virtual_gamepad, name)
+
+
+def _warmup_quietly():
+    from vgamepad.win.virtual_gamepad import get_vbus
+    try:
+        get_vbus()
+    except Exception:
+        pass  # raised again by the first gamepad creation
+
+
+def warmup(background=False):
+    """
+    Loads ViGEmClient.dll and connects to ViGEmBus ahead of the first device creation
+    (both otherwise happen when the first gamepad is created).
+    If this fails in the background, the error is raised again when creating a gamepad.
+
+    :param: True to run in a daemon thread and return it instead of blocking
+    """
+    if background:
+        thread = threading.Thread(target=_warmup_quietly, name='vgamepad-warmup', daemon=True)
+        thread.start()
+        return thread
+    from vgamepad.win.virtual_gamepad import get_vbus
+    get_vbus()
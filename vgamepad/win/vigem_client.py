@@ -3,8 +3,9 @@ Adapted from ViGEm source
 """
 
 import platform
+import threading
 from pathlib import Path
-from ctypes import CDLL, POINTER, CFUNCTYPE, c_void_p, c_uint, c_ushort, c_ulong, c_bool, c_ubyte
+from ctypes import CDLL, POINTER, CFUNCTYPE, c_void_p, c_uint, c_ushort, c_ulong, c_bool, c_ubyte, c_char_p
 from vgamepad.win.vigem_commons import XUSB_REPORT, DS4_REPORT, DS4_REPORT_EX, VIGEM_TARGET_TYPE
 
 if platform.architecture()[0] == "64bit":
@@ -13,24 +14,64 @@ else:
     arch = "x86"
 
 pathClient = Path(__file__).parent.absolute() / "vigem" / "client" / arch / "ViGEmClient.dll"
-vigemClient = CDLL(str(pathClient))
+
+# The DLL is loaded and its functions bound on first use of any of them (or an explicit load()),
+# so importing this module stays cheap for processes that never create a device.
+vigemClient = None
+_prototypes = {}
+_load_lock = threading.Lock()
+
+
+def _prototype(name, argtypes, restype, symbol=None):
+    """
+    Declares a function of the DLL
+
+    :param name: the name it is bound to in this module
+    :param argtypes: its argument types
+    :param restype: its return type
+    :param symbol: the name of the exported function, if it is bound under another name with another signature
+    """
+    _prototypes[name] = (argtypes, restype, symbol or name)
+
+
+def load():
+    """
+    Loads ViGEmClient.dll and binds the functions below (thread safe, only done once)
+
+    :return: the CDLL
+    """
+    global vigemClient
+    with _load_lock:
+        if vigemClient is None:
+            dll = CDLL(str(pathClient))
+            for name, (argtypes, restype, symbol) in _prototypes.items():
+                # indexing gives a new function object each time, so one export can have several signatures
+                function = dll[symbol]
+                function.argtypes = argtypes
+                function.restype = restype
+                globals()[name] = function
+            vigemClient = dll
+    return vigemClient
+
+
+def __getattr__(name):
+    if name in _prototypes:
+        load()
+        return globals()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 """
 Allocates an object representing a driver connection
 @returns    A PVIGEM_CLIENT object
 """
-vigem_alloc = vigemClient.vigem_alloc
-vigem_alloc.argtypes = ()
-vigem_alloc.restype = c_void_p
+_prototype("vigem_alloc", (), c_void_p)
 
 """
 Frees up memory used by the driver connection object
 @param      vigem   The PVIGEM_CLIENT object.
 """
-vigem_free = vigemClient.vigem_free
-vigem_free.argtypes = (c_void_p, )
-vigem_free.restype = None
+_prototype("vigem_free", (c_void_p, ), None)
 
 """
 Initializes the driver object and establishes a connection to the emulation bus driver.
@@ -38,9 +79,7 @@ Returns an error if no compatible bus device has been found.
 @param 	    vigem	The PVIGEM_CLIENT object.
 @returns	A VIGEM_ERROR.
 """
-vigem_connect = vigemClient.vigem_connect
-vigem_connect.argtypes = (c_void_p, )
-vigem_connect.restype = c_uint
+_prototype("vigem_connect", (c_void_p, ), c_uint)
 
 """
 Disconnects from the bus device and resets the driver object state. The driver object
@@ -49,25 +88,19 @@ still be connected will be destroyed automatically. Be aware, that allocated tar
 objects won't be automatically freed, this has to be taken care of by the caller.
 @param      vigem	The PVIGEM_CLIENT object.
 """
-vigem_disconnect = vigemClient.vigem_disconnect
-vigem_disconnect.argtypes = (c_void_p, )
-vigem_disconnect.restype = None
+_prototype("vigem_disconnect", (c_void_p, ), None)
 
 """
 Allocates an object representing an Xbox 360 Controller device.
 @returns	A PVIGEM_TARGET representing an Xbox 360 Controller device.
 """
-vigem_target_x360_alloc = vigemClient.vigem_target_x360_alloc
-vigem_target_x360_alloc.argtypes = ()
-vigem_target_x360_alloc.restype = c_void_p
+_prototype("vigem_target_x360_alloc", (), c_void_p)
 
 """
 Allocates an object representing a DualShock 4 Controller device.
 @returns	A PVIGEM_TARGET representing a DualShock 4 Controller device.
 """
-vigem_target_ds4_alloc = vigemClient.vigem_target_ds4_alloc
-vigem_target_ds4_alloc.argtypes = ()
-vigem_target_ds4_alloc.restype = c_void_p
+_prototype("vigem_target_ds4_alloc", (), c_void_p)
 
 """
 Frees up memory used by the target device object. This does not automatically remove
@@ -76,9 +109,7 @@ removed before this call, the device becomes orphaned until the owning process i
 terminated.
 @param 	    target	The target device object.
 """
-vigem_target_free = vigemClient.vigem_target_free
-vigem_target_free.argtypes = (c_void_p, )
-vigem_target_free.restype = None
+_prototype("vigem_target_free", (c_void_p, ), None)
 
 """
 Adds a provided target device to the bus driver, which is equal to a device plug-in
@@ -88,9 +119,7 @@ in full operational mode.
 @param 	    target	The target device object.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_add = vigemClient.vigem_target_add
-vigem_target_add.argtypes = (c_void_p, c_void_p)
-vigem_target_add.restype = c_uint
+_prototype("vigem_target_add", (c_void_p, c_void_p), c_uint)
 
 """
 Removes a provided target device from the bus driver, which is equal to a device
@@ -101,45 +130,35 @@ objects, they will be removed from the bus when the owning process terminates.
 @param 	    target	The target device object.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_remove = vigemClient.vigem_target_remove
-vigem_target_remove.argtypes = (c_void_p, c_void_p)
-vigem_target_remove.restype = c_uint
+_prototype("vigem_target_remove", (c_void_p, c_void_p), c_uint)
 
 """
 Overrides the default Vendor ID value with the provided one.
 @param 	    target	The target device object.
 @param 	    vid   	The Vendor ID to set.
 """
-vigem_target_set_vid = vigemClient.vigem_target_set_vid
-vigem_target_set_vid.argtypes = (c_void_p, c_ushort)
-vigem_target_set_vid.restype = None
+_prototype("vigem_target_set_vid", (c_void_p, c_ushort), None)
 
 """
 Overrides the default Product ID value with the provided one.
 @param 	    target	The target device object.
 @param 	    pid   	The Product ID to set.
 """
-vigem_target_set_pid = vigemClient.vigem_target_set_pid
-vigem_target_set_pid.argtypes = (c_void_p, c_ushort)
-vigem_target_set_pid.restype = None
+_prototype("vigem_target_set_pid", (c_void_p, c_ushort), None)
 
 """
 Returns the Vendor ID of the provided target device object.
 @param 	    target	The target device object.
 @returns	The Vendor ID.
 """
-vigem_target_get_vid = vigemClient.vigem_target_get_vid
-vigem_target_get_vid.argtypes = (c_void_p, )
-vigem_target_get_vid.restype = c_ushort
+_prototype("vigem_target_get_vid", (c_void_p, ), c_ushort)
 
 """
 Returns the Product ID of the provided target device object.
 @param 	    target	The target device object.
 @returns	The Product ID.
 """
-vigem_target_get_pid = vigemClient.vigem_target_get_pid
-vigem_target_get_pid.argtypes = (c_void_p, )
-vigem_target_get_pid.restype = c_ushort
+_prototype("vigem_target_get_pid", (c_void_p, ), c_ushort)
 
 """
 Sends a state report to the provided target device.
@@ -148,9 +167,7 @@ Sends a state report to the provided target device.
 @param 	    report	The report to send to the target device.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_x360_update = vigemClient.vigem_target_x360_update
-vigem_target_x360_update.argtypes = (c_void_p, c_void_p, XUSB_REPORT)
-vigem_target_x360_update.restype = c_uint
+_prototype("vigem_target_x360_update", (c_void_p, c_void_p, XUSB_REPORT), c_uint)
 
 """
 Sends a state report to the provided target device.
@@ -159,9 +176,23 @@ Sends a state report to the provided target device.
 @param 	    report	The report to send to the target device.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_ds4_update = vigemClient.vigem_target_ds4_update
-vigem_target_ds4_update.argtypes = (c_void_p, c_void_p, DS4_REPORT)
-vigem_target_ds4_update.restype = c_uint
+_prototype("vigem_target_ds4_update", (c_void_p, c_void_p, DS4_REPORT), c_uint)
+
+"""
+The x64 calling convention passes structures larger than 8 bytes by reference, so on x64
+the two functions above also take a pointer to the raw bytes of a report. These bindings
+send a report from a bytes object without building an XUSB_REPORT or DS4_REPORT.
+They do not exist on x86, where the report is copied on the stack.
+@param 	    vigem 	The driver connection object.
+@param 	    target	The target device object.
+@param 	    report	The report's bytes.
+@returns	A VIGEM_ERROR.
+"""
+if arch == "x64":
+    _prototype("vigem_target_x360_update_buffer", (c_void_p, c_void_p, c_char_p), c_uint,
+               symbol="vigem_target_x360_update")
+    _prototype("vigem_target_ds4_update_buffer", (c_void_p, c_void_p, c_char_p), c_uint,
+               symbol="vigem_target_ds4_update")
 
 """
 Note: this is a function not present in the master branch of vigem client.
@@ -174,9 +205,9 @@ Sends a full size state report to the provided target device.
 @param 	    report_ptr	A pointer to the report buffer.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_ds4_update_ex_ptr = vigemClient.vigem_target_ds4_update_ex_ptr
-vigem_target_ds4_update_ex_ptr.argtypes = (c_void_p, c_void_p, POINTER(DS4_REPORT_EX))
-vigem_target_ds4_update_ex_ptr.restype = c_uint
+_prototype("vigem_target_ds4_update_ex_ptr", (c_void_p, c_void_p, POINTER(DS4_REPORT_EX)), c_uint)
+_prototype("vigem_target_ds4_update_ex_buffer", (c_void_p, c_void_p, c_char_p), c_uint,
+           symbol="vigem_target_ds4_update_ex_ptr")
 
 """
 Returns the internal index (serial number) the bus driver assigned to the provided
@@ -189,18 +220,14 @@ device.
 @param 	    target	The target device object.
 @returns	The internally used index of the target device.
 """
-vigem_target_get_index = vigemClient.vigem_target_get_index
-vigem_target_get_index.argtypes = (c_void_p, )
-vigem_target_get_index.restype = c_ulong
+_prototype("vigem_target_get_index", (c_void_p, ), c_ulong)
 
 """
 Returns the type of the provided target device object.
 @param 	    target	The target device object.
 @returns	A VIGEM_TARGET_TYPE.
 """
-vigem_target_get_type = vigemClient.vigem_target_get_type
-vigem_target_get_type.argtypes = (c_void_p, )
-vigem_target_get_type.restype = VIGEM_TARGET_TYPE
+_prototype("vigem_target_get_type", (c_void_p, ), VIGEM_TARGET_TYPE)
 
 """
 Returns TRUE if the provided target device object is currently attached to the bus,
@@ -208,9 +235,7 @@ FALSE otherwise.
 @param 	    target	The target device object.
 @returns	TRUE if device is attached to the bus, FALSE otherwise.
 """
-vigem_target_is_attached = vigemClient.vigem_target_is_attached
-vigem_target_is_attached.argtypes = (c_void_p, )
-vigem_target_is_attached.restype = c_bool
+_prototype("vigem_target_is_attached", (c_void_p, ), c_bool)
 
 """
 Returns the user index of the emulated Xenon device. This value correspondents to the
@@ -222,9 +247,7 @@ XInput* APIs.
 @param 	    index 	The (zero-based) user index of the Xenon device. (PULONG)
 @returns	A VIGEM_ERROR.
 """
-vigem_target_x360_get_user_index = vigemClient.vigem_target_x360_get_user_index
-vigem_target_x360_get_user_index.argtypes = (c_void_p, c_void_p, c_void_p)
-vigem_target_x360_get_user_index.restype = c_uint
+_prototype("vigem_target_x360_get_user_index", (c_void_p, c_void_p, c_void_p), c_uint)
 
 """
 Registers a function which gets called, when LED index or vibration state changes
@@ -236,17 +259,13 @@ target device isn't fully operational or in an erroneous state.
 @param 	userData		The user data passed to the notification callback.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_x360_register_notification = vigemClient.vigem_target_x360_register_notification
-vigem_target_x360_register_notification.argtypes = (c_void_p, c_void_p, c_void_p, c_void_p)
-vigem_target_x360_register_notification.restype = c_uint
+_prototype("vigem_target_x360_register_notification", (c_void_p, c_void_p, c_void_p, c_void_p), c_uint)
 
 """
 Removes a previously registered callback function from the provided target object.
 @param 	target	The target device object.
 """
-vigem_target_x360_unregister_notification = vigemClient.vigem_target_x360_unregister_notification
-vigem_target_x360_unregister_notification.argtypes = (c_void_p, )
-vigem_target_x360_unregister_notification.restype = None
+_prototype("vigem_target_x360_unregister_notification", (c_void_p, ), None)
 
 """
 Registers a function which gets called, when LightBar or vibration state changes
@@ -258,14 +277,10 @@ target device isn't fully operational or in an erroneous state.
 @param 	userData		The user data passed to the notification callback.
 @returns	A VIGEM_ERROR.
 """
-vigem_target_ds4_register_notification = vigemClient.vigem_target_ds4_register_notification
-vigem_target_ds4_register_notification.argtypes = (c_void_p, c_void_p, c_void_p, c_void_p)
-vigem_target_ds4_register_notification.restype = c_uint
+_prototype("vigem_target_ds4_register_notification", (c_void_p, c_void_p, c_void_p, c_void_p), c_uint)
 
 """
 Removes a previously registered callback function from the provided target object.
 @param 	target	The target device object.
 """
-vigem_target_ds4_unregister_notification = vigemClient.vigem_target_ds4_unregister_notification
-vigem_target_ds4_unregister_notification.argtypes = (c_void_p, )
-vigem_target_ds4_unregister_notification.restype = None
+_prototype("vigem_target_ds4_unregister_notification", (c_void_p, ), None)
@@ -2,6 +2,7 @@
 Adapted from ViGEm source
 """
 
+import struct
 from enum import IntFlag, IntEnum
 from ctypes import Structure, Union, c_short, c_ushort, c_ubyte
 
@@ -52,6 +53,10 @@ class XUSB_REPORT(Structure):
                 ("sThumbRY", c_short)]
 
 
+# Byte layout of XUSB_REPORT, to build one from all its values in a single call
+XUSB_REPORT_STRUCT = struct.Struct('<HBBhhhh')
+
+
 class DS4_LIGHTBAR_COLOR(Structure):
     """
     The color value (RGB) of a DualShock 4 Lightbar
@@ -116,6 +121,10 @@ class DS4_REPORT(Structure):
                 ("bTriggerR", c_byte)]
 
 
+# Byte layout of DS4_REPORT (wButtons is aligned, leaving a padding byte at the end)
+DS4_REPORT_STRUCT = struct.Struct('<BBBBHBBBx')
+
+
 def DS4_SET_DPAD(report, dpad):
     report.wButtons &= ~0xF
     report.wButtons |= dpad  # TODO cast USHORT?
@@ -5,6 +5,7 @@ VGamepad API (Windows)
 import vgamepad.win.vigem_commons as vcom
 import vgamepad.win.vigem_client as vcli
 import ctypes
+import threading
 from ctypes import CFUNCTYPE, c_void_p, c_ubyte
 from abc import ABC, abstractmethod
 from inspect import signature  # Check if user defined callback function is legal
@@ -34,6 +35,7 @@ class VBus:
     Virtual USB bus (ViGEmBus)
     """
     def __init__(self):
+        self._busp = None
         self._busp = vcli.vigem_alloc()
         check_err(vcli.vigem_connect(self._busp))
 
@@ -41,17 +43,39 @@ class VBus:
         return self._busp
 
     def __del__(self):
+        if self._busp is None:  # ViGEmClient.dll could not be loaded
+            return
         vcli.vigem_disconnect(self._busp)
         vcli.vigem_free(self._busp)
 
 
-# We instantiate a single global VBus for all controllers
-VBUS = VBus()
+# We instantiate a single global VBus for all controllers, on first use
+_VBUS = None
+_vbus_lock = threading.Lock()
+
+
+def get_vbus():
+    """
+    :return: the global VBus, loading ViGEmClient.dll and connecting to ViGEmBus on the first call
+    """
+    global _VBUS
+    with _vbus_lock:
+        if _VBUS is None:
+            _VBUS = VBus()
+    return _VBUS
+
+
+def __getattr__(name):
+    # VBUS used to be created at import time
+    if name == 'VBUS':
+        return get_vbus()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 class VGamepad(ABC):
     def __init__(self):
-        self.vbus = VBUS
+        self._devicep = None
+        self.vbus = get_vbus()
         self._busp = self.vbus.get_busp()
         self._devicep = self.target_alloc()
         self.CMPFUNC = CFUNCTYPE(None, c_void_p, c_void_p, c_ubyte, c_ubyte, c_ubyte, c_void_p)
@@ -60,6 +84,8 @@ class VGamepad(ABC):
         assert vcli.vigem_target_is_attached(self._devicep), "The virtual device could not connect to ViGEmBus."
 
     def __del__(self):
+        if self._devicep is None:  # the bus connection failed
+            return
         vcli.vigem_target_remove(self._busp, self._devicep)
         vcli.vigem_target_free(self._devicep)
 
@@ -99,6 +125,16 @@ class VGamepad(ABC):
         """
         return vcli.vigem_target_get_type(self._devicep)
 
+    def _write_report(self, data):
+        """
+        Overwrites the whole report with raw bytes
+
+        :return: True if the report changed
+        """
+        changed = data != bytes(self.report)
+        ctypes.memmove(ctypes.addressof(self.report), data, len(data))
+        return changed
+
     @abstractmethod
     def target_alloc(self):
         """
@@ -216,12 +252,42 @@ class VX360Gamepad(VGamepad):
         """
         self.right_joystick(round(x_value_float * 32767), round(y_value_float * 32767))
 
+    def set_state(self, buttons, left_trigger, right_trigger, left_x, left_y, right_x, right_y):
+        """
+        Sets the whole report at once, instead of one call per button, trigger and joystick
+
+        :param buttons: the OR of the XUSB_BUTTON fields of the pressed buttons
+        :param left_trigger: integer between 0 and 255 (0 = trigger released)
+        :param right_trigger: integer between 0 and 255 (0 = trigger released)
+        :param left_x: integer between -32768 and 32767 (0 = neutral position)
+        :param left_y: integer between -32768 and 32767 (0 = neutral position)
+        :param right_x: integer between -32768 and 32767 (0 = neutral position)
+        :param right_y: integer between -32768 and 32767 (0 = neutral position)
+        :return: True if the report changed
+        """
+        return self._write_report(vcom.XUSB_REPORT_STRUCT.pack(buttons, left_trigger, right_trigger,
+                                                               left_x, left_y, right_x, right_y))
+
     def update(self):
         """
         Sends the current report (i.e. commands) to the virtual device
         """
         check_err(vcli.vigem_target_x360_update(self._busp, self._devicep, self.report))
 
+    def update_from_buffer(self, buffer):
+        """
+        Sends a report given as raw bytes laid out like XUSB_REPORT, without building an XUSB_REPORT
+        On x64 the bytes are passed to the driver as they are. self.report is left unchanged.
+
+        :param: a bytes-like object of sizeof(XUSB_REPORT) bytes
+        """
+        if len(buffer) != ctypes.sizeof(vcom.XUSB_REPORT):
+            raise ValueError("Expected {} bytes, got {}".format(ctypes.sizeof(vcom.XUSB_REPORT), len(buffer)))
+        if vcli.arch == "x64":
+            check_err(vcli.vigem_target_x360_update_buffer(self._busp, self._devicep, bytes(buffer)))
+        else:
+            check_err(vcli.vigem_target_x360_update(self._busp, self._devicep, vcom.XUSB_REPORT.from_buffer_copy(buffer)))
+
     def register_notification(self, callback_function):
         """
         Registers a callback function that can handle force feedback, leds, etc.
@@ -387,12 +453,51 @@ class VDS4Gamepad(VGamepad):
         """
         vcom.DS4_SET_DPAD(self.report, direction)
 
+    def set_state(self, buttons, special_buttons, left_trigger, right_trigger, left_x, left_y, right_x, right_y,
+                  direction=vcom.DS4_DPAD_DIRECTIONS.DS4_BUTTON_DPAD_NONE):
+        """
+        Sets the whole report at once, instead of one call per button, trigger and joystick
+        Note: joystick values are written as they are, the Y axis is not multiplied by -1 as in left_joystick
+
+        :param buttons: the OR of the DS4_BUTTONS fields of the pressed buttons
+        :param special_buttons: the OR of the DS4_SPECIAL_BUTTONS fields of the pressed special buttons
+        :param left_trigger: integer between 0 and 255 (0 = trigger released)
+        :param right_trigger: integer between 0 and 255 (0 = trigger released)
+        :param left_x: integer between 0 and 255 (128 = neutral position)
+        :param left_y: integer between 0 and 255 (128 = neutral position)
+        :param right_x: integer between 0 and 255 (128 = neutral position)
+        :param right_y: integer between 0 and 255 (128 = neutral position)
+        :param direction: a DS4_DPAD_DIRECTIONS field for the directional pad (hat)
+        :return: True if the report changed
+        """
+        return self._write_report(vcom.DS4_REPORT_STRUCT.pack(left_x, left_y, right_x, right_y,
+                                                              (buttons & ~0xF) | direction, special_buttons,
+                                                              left_trigger, right_trigger))
+
     def update(self):
         """
         Sends the current report (i.e. commands) to the virtual device
         """
         check_err(vcli.vigem_target_ds4_update(self._busp, self._devicep, self.report))
 
+    def update_from_buffer(self, buffer):
+        """
+        Sends a report given as raw bytes laid out like DS4_REPORT or DS4_REPORT_EX, without building one
+        On x64 (and always for DS4_REPORT_EX) the bytes are passed to the driver as they are.
+        self.report is left unchanged.
+
+        :param: a bytes-like object of sizeof(DS4_REPORT) or sizeof(DS4_REPORT_EX) bytes
+        """
+        if len(buffer) == ctypes.sizeof(vcom.DS4_REPORT_EX):
+            check_err(vcli.vigem_target_ds4_update_ex_buffer(self._busp, self._devicep, bytes(buffer)))
+        elif len(buffer) != ctypes.sizeof(vcom.DS4_REPORT):
+            raise ValueError("Expected {} or {} bytes, got {}".format(ctypes.sizeof(vcom.DS4_REPORT),
+                                                                      ctypes.sizeof(vcom.DS4_REPORT_EX), len(buffer)))
+        elif vcli.arch == "x64":
+            check_err(vcli.vigem_target_ds4_update_buffer(self._busp, self._devicep, bytes(buffer)))
+        else:
+            check_err(vcli.vigem_target_ds4_update(self._busp, self._devicep, vcom.DS4_REPORT.from_buffer_copy(buffer)))
+
     def update_extended_report(self, extended_report):
         """
         Enables using DS4_REPORT_EX instead of DS4_REPORT (advanced users only)
@@ -0,0 +1,184 @@
+"""
+Multi-worker mode
+
+Runs several server processes on the same port, so that decoding and translating the
+frames of many controllers is spread over several cores. Each worker owns the sessions
+of the connections it accepted, with its own device pool. On Linux every worker listens
+on a SO_REUSEPORT socket of its own and the kernel spreads new connections across them;
+elsewhere the supervisor listens and all workers accept from its socket.
+
+Player slots are claimed in a table shared by the workers, so each slot is used by one
+session at most, whichever worker it is on. A client that reconnects to another worker
+than its session's gets a new session; the old one ends when its grace period expires.
+
+Plain HTTP requests (/slots, /metrics, /profile) are answered by whichever worker
+accepts them, about the sessions of that worker. With STADIA_UDP_PORT set, worker N
+receives datagrams on that port + N (any free port when it is 0); the welcome tells
+each client its worker's port.
+"""
+
+import multiprocessing
+import socket
+import sys
+import threading
+from multiprocessing import connection
+
+import config
+
+# the kernel balances connections between the workers' own sockets
+REUSE_PORT = sys.platform.startswith('linux') and hasattr(socket, 'SO_REUSEPORT')
+
+
+class SharedSlots:
+    """
+    Player slot table shared by the worker processes, see sessions.SessionManager
+    """
+
+    def __init__(self, size, context=multiprocessing):
+        """
+        :param size: number of player slots
+        :param context: the multiprocessing context the workers are started from
+        """
+        # 1 + the index of the worker owning each slot, 0 if it is free
+        self.owners = context.Array('b', size)
+        # index of the worker this copy is used in, set as it starts
+        self.worker = None
+
+    def claim(self):
+        """
+        :return: the lowest free slot, now owned by this worker, None if all are taken
+        """
+        with self.owners.get_lock():
+            owners = self.owners.get_obj()
+            for slot, owner in enumerate(owners):
+                if not owner:
+                    owners[slot] = self.worker + 1
+                    return slot
+        return None
+
+    def free(self, slot):
+        with self.owners.get_lock():
+            self.owners.get_obj()[slot] = 0
+
+    def free_worker(self, worker):
+        """
+        Frees the slots of a worker that exited
+        """
+        with self.owners.get_lock():
+            owners = self.owners.get_obj()
+            for slot, owner in enumerate(owners):
+                if owner == worker + 1:
+                    owners[slot] = 0
+
+
+def listen(host, port):
+    """
+    :return: a socket listening on (host, port) next to the other workers'
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    return sock
+
+
+def work(index, listener, port, slots, stop, started):
+    """
+    Main function of a worker process
+
+    :param index: the worker's index
+    :param listener: the supervisor's listening socket, None to listen on a SO_REUSEPORT socket
+    :param port: the port to listen on
+    :param slots: the SharedSlots
+    :param stop: a multiprocessing Event set to stop the worker
+    :param started: a multiprocessing Semaphore released once the worker accepts connections
+    """
+    import asyncio
+    import server
+    import startup
+
+    slots.worker = index
+    if listener is None:
+        listener = listen(config.HOST, port)
+    udp_port = config.UDP_PORT
+    if udp_port:
+        udp_port += index
+    engine, driver = server.create_engine(slots)
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+
+        def wait():
+            supervisor = multiprocessing.parent_process()
+            # a supervisor that was killed cannot set `stop`
+            while not stop.wait(0.5) and supervisor.is_alive():
+                pass
+            loop.call_soon_threadsafe(done.set)
+        threading.Thread(target=wait, name='stop', daemon=True).start()
+
+        def ready(port):
+            startup.mark('serving')
+            started.release()
+        await engine.serve(config.HOST, None, done, ready, udp_port, listener)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches every worker, the supervisor stops them
+    finally:
+        if driver is not None:
+            driver.close()
+
+
+def main(port, count, ready):
+    """
+    Starts `count` workers and restarts any that exits, until stopped from the tray icon or with Ctrl+C
+
+    :param port: the port to serve on, 0 for any free one
+    :param count: the number of workers
+    :param ready: called with the port and a function stopping the workers, once they are started
+    """
+    context = multiprocessing.get_context('spawn')
+    slots = SharedSlots(config.MAX_PLAYERS, context)
+    stop = context.Event()
+    started = context.Semaphore(0)
+    if REUSE_PORT:
+        # bound but not listening: keeps the port, and the kernel hands it no connections
+        reserved = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        reserved.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        reserved.bind((config.HOST, port))
+        listener = None
+    else:
+        reserved = listener = socket.create_server((config.HOST, port), backlog=socket.SOMAXCONN)
+    port = reserved.getsockname()[1]
+
+    def start(index):
+        process = context.Process(target=work, args=(index, listener, port, slots, stop, started),
+                                  name='stadia-worker-{}'.format(index))
+        process.start()
+        return process
+
+    workers = [start(index) for index in range(count)]
+    try:
+        for _ in workers:
+            while not started.acquire(timeout=0.5):
+                if any(process.exitcode is not None for process in workers):
+                    raise RuntimeError("A worker exited while starting")
+        ready(port, stop.set)
+        while not stop.is_set():
+            connection.wait([process.sentinel for process in workers], timeout=0.5)
+            for index, process in enumerate(workers):
+                if process.exitcode is not None and not stop.is_set():
+                    print("Worker {} exited with status {}, restarting it".format(index, process.exitcode))
+                    slots.free_worker(index)
+                    workers[index] = start(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for process in workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        reserved.close()